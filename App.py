@@ -1,3 +1,4 @@
+import os
 import tkinter as tk
 import customtkinter
 import gpib_ctypes
@@ -22,6 +23,7 @@ from Components.BottomTabBar import BottomTabBar
 
 from Utils.CalibrationUtils import CalibrationUtils
 from Utils.GenerationAndDisplayUtils import GenerationAndDisplayUtils
+from Utils.UIDispatcher import UIDispatcher
 from Utils.color_theme import COLORS
 
 import screeninfo
@@ -34,7 +36,12 @@ class App(customtkinter.CTk,CalibrationUtils,GenerationAndDisplayUtils):
 
         self.selected_mode = ""
         self.skip_fake_version = True
+        # "@emulator" runs the real SCPI path against Utils.Emulator instead of the GPIB bus, EMULATOR_* variables
+        # such as EMULATOR_SETTLE_TIME or EMULATOR_BUS_LATENCY tune its timing and noise
+        self.visa_backend = os.environ.get("VISA_BACKEND", "")
         super().__init__()
+        # every widget update from a worker thread goes through here
+        self.ui = UIDispatcher(self)
         self.configure(fg_color=COLORS["backgroundLight"], bg_color=COLORS["backgroundLight"])
 
         self.default_color = COLORS["backgroundLight"]
@@ -94,7 +101,7 @@ class App(customtkinter.CTk,CalibrationUtils,GenerationAndDisplayUtils):
 
         # === Inside Lower Panel (Graph + Terminal toggle) ===
         self.graph = GraphComponent(self.lower_panel,self.selected_mode)
-        self.terminal = TerminalOutput(self.lower_panel)
+        self.terminal = TerminalOutput(self.lower_panel, self.ui)
 
         self.graph.pack_forget()
         self.terminal.grid(row=0, column=0, sticky="nsew")
@@ -129,58 +136,13 @@ class App(customtkinter.CTk,CalibrationUtils,GenerationAndDisplayUtils):
 
         self.show_input_popup()
 
-    def get_pairs(self):
-        total_refs = len(self.measParameters["references"])
-        count = 0
-        i = 0
-        while i < total_refs:
-            r1 = abs(self.measParameters["references"][i])
-            r2 = abs(self.measParameters["references"][i + 1]) if i + 1 < total_refs else None
-            r3 = abs(self.measParameters["references"][i + 2]) if i + 2 < total_refs else None
-
-            is_triple = r1 == r2 == r3
-            is_pair = r1 == r2 and not is_triple
-
-            if is_triple:
-                i += 3
-            elif is_pair:
-                i += 2
-            else:
-                i += 1
-            count += 1
-
-        total_blocks = count
-        return total_blocks
-
     def update_display_label(self, mode):
+        """ One display block per reference magnitude, three frequencies, a ± pair or a single point """
+        references = self.measParameters["references"]
+        units = self.measParameters["units"]
+        blocks = []
         j = 0
-        total_blocks_required = self.get_pairs()  # how many are needed based on current data
-        total_blocks_available = len(self.upper_panel.value_display.pair_indices)  # always 7 for now
-
-        # Step 1: Hide all headers and all labels
-        for i in range(total_blocks_available):
-            self.upper_panel.value_display.headers[i].grid_remove()
-
-            for label_list in (
-                    self.upper_panel.value_display.single_value_labels,
-                    self.upper_panel.value_display.single_diff_labels,
-                    self.upper_panel.value_display.single_std_labels,
-                    self.upper_panel.value_display.value_labels,
-                    self.upper_panel.value_display.diff_labels,
-                    self.upper_panel.value_display.std_labels,
-            ):
-                for k in range(3):
-                    idx = i * 3 + k
-                    if idx < len(label_list):
-                        label_list[idx].grid_remove()
-
-        # Step 2: Re-show the blocks you need
-        for block_index in range(total_blocks_required):
-            if j >= len(self.measParameters["references"]):
-                break
-
-            references = self.measParameters["references"]
-            units = self.measParameters["units"]
+        while j < len(references):
             unit = units[j]
             ref = references[j]
             r1 = abs(ref)
@@ -191,51 +153,21 @@ class App(customtkinter.CTk,CalibrationUtils,GenerationAndDisplayUtils):
             is_pair = (r1 == r2) and not is_triple
 
             if is_triple:
-
                 unique_freqs = list(dict.fromkeys(self.measParameters['frequencies']))
                 freq_text = ", ".join(f"{f}" for f in unique_freqs)
-                text = f"Measured at {r1} {unit} at {freq_text}"
-                print(self.measParameters["units"])
-
-                self.upper_panel.value_display.switch_to_triple(block_index)
-                self.upper_panel.value_display.headers[block_index].configure(
-                    text=text
-                )
-                self.upper_panel.value_display.headers[block_index].grid()
+                blocks.append((f"Measured at {r1} {unit} at {freq_text}", 3))
                 j += 3
             elif is_pair:
-                self.upper_panel.value_display.switch_to_double(block_index)
-                self.upper_panel.value_display.headers[block_index].configure(
-                    text=f"Measured at ±{r1} {unit}"
-                )
-                self.upper_panel.value_display.headers[block_index].grid()
+                blocks.append((f"Measured at ±{r1} {unit}", 2))
                 j += 2
             else:
-                self.upper_panel.value_display.switch_to_single(block_index)
-                self.upper_panel.value_display.headers[block_index].configure(
-                    text=f"Measured at {ref} {unit}"
-                )
-                self.upper_panel.value_display.headers[block_index].grid()
+                blocks.append((f"Measured at {ref} {unit}", 1))
                 j += 1
+        self.upper_panel.value_display.set_layout(blocks)
 
     def clear_values(self):
         """Clear all displayed measurement, difference, and standard deviation values."""
-
-        # Clear standard (multi-label) layout
-        for i, label in enumerate(self.upper_panel.value_display.value_labels):
-            label.configure(text="--")
-        for i, label in enumerate(self.upper_panel.value_display.diff_labels):
-            label.configure(text="Δ --")
-        for i, label in enumerate(self.upper_panel.value_display.std_labels):
-            label.configure(text="σ --")
-
-        # Clear single layout
-        for i, label in enumerate(self.upper_panel.value_display.single_value_labels):
-            label.configure(text="--")
-        for i, label in enumerate(self.upper_panel.value_display.single_diff_labels):
-            label.configure(text="Δ --")
-        for i, label in enumerate(self.upper_panel.value_display.single_std_labels):
-            label.configure(text="σ --")
+        self.upper_panel.value_display.clear()
 
         # Reset stored values
         self.vals = []
@@ -261,8 +193,12 @@ class App(customtkinter.CTk,CalibrationUtils,GenerationAndDisplayUtils):
 
     def on_closing(self):
         """ Cleanup when closing the app """
+        self.running = False
+        self.engine.close()
+        self.instruments.close_all()
         if self.conn:
             self.close()
+        self.terminal.close()
         self.destroy()
 
     def hide_all_pages(self):
@@ -341,13 +277,15 @@ class App(customtkinter.CTk,CalibrationUtils,GenerationAndDisplayUtils):
             self.current_calibration_id = self.log_new_calibration(self.selected_mode)
             self.terminal.log(f"Started new calibration session: ID {self.current_calibration_id}")
 
-            threading.Thread(target=self.get_calibration_values, daemon=True).start()
+            self.engine.submit(self.get_calibration_values)
             self.upper_panel.controls.stop_button.configure(state="enabled",fg_color="red")
         self.upper_panel.controls.start_button.configure(state="disabled",fg_color="#B0B0B0")
 
     def stop_action(self,clear_graph=True):
         """ Stop generating values """
         self.running = False
+        self.engine.stop()
+        self.flush_results()
         if clear_graph:
             self.graph.clear_graph()
         self.terminal.log("Stopped.")
@@ -1,5 +1,15 @@
+from datetime import datetime
+from tkinter import filedialog
+
 import customtkinter
+from Components.VirtualTable import VirtualTable
 from Utils.color_theme import COLORS
+from Utils.DriftSummary import fetch_drift
+from Utils.Export import EXPORT_FORMATS, ExportJob
+from Utils.SessionQueries import fetch_sessions, format_timestamp, session_cursor
+
+MODES = ["All modes", "DCV", "DCI", "ACV", "ACI", "RES", "FREQ."]
+PAGE_SIZE = 25
 
 
 class DatabaseOverview(customtkinter.CTkFrame):
@@ -15,6 +25,10 @@ class DatabaseOverview(customtkinter.CTkFrame):
         self.grid(row=0, column=1, rowspan=3, padx=20, pady=20, sticky="nsew")
 
         self.database = parent.conn
+        self.session_cache = parent.session_cache
+        self.archive = parent.archive
+        self.db_name = parent.db_name
+        self.export_job = None
         self.selected_calibration = None
         self.callback = callback
 
@@ -27,148 +41,256 @@ class DatabaseOverview(customtkinter.CTkFrame):
         )
         self.back_button.grid(row=0, column=0, sticky="w", padx=5, pady=(5, 10))
 
+        self.actions_frame = customtkinter.CTkFrame(self, fg_color=self.default_color)
+        self.actions_frame.grid(row=0, column=0, sticky="e", padx=5, pady=(5, 10))
+
+        # === Export, streams the filtered sessions to a file in the background ===
+        self.export_format = customtkinter.CTkOptionMenu(self.actions_frame, values=list(EXPORT_FORMATS), width=140)
+        self.export_format.pack(side="left", padx=(0, 5))
+        self.export_button = customtkinter.CTkButton(
+            self.actions_frame, text="Export", width=80, command=self.start_export
+        )
+        self.export_button.pack(side="left", padx=(0, 5))
+
+        # === Drift Button, switches between the selected session and the drift summary ===
+        self.drift_button = customtkinter.CTkButton(
+            self.actions_frame, text="Drift", width=80, command=self.toggle_drift
+        )
+        self.drift_button.pack(side="left")
+        self.showing_drift = False
+
+        self.export_frame = customtkinter.CTkFrame(self, fg_color=self.default_color)
+        self.export_progress = customtkinter.CTkProgressBar(self.export_frame)
+        self.export_progress.pack(side="left", fill="x", expand=True, padx=(0, 10))
+        self.export_status = customtkinter.CTkLabel(self.export_frame, text="", text_color=self.text_color)
+        self.export_status.pack(side="left")
+
         # === Dropdown (Custom Scrollable) ===
         self.dropdown_frame = customtkinter.CTkFrame(self, fg_color=self.default_color)
         self.dropdown_frame.grid(row=1, column=0, sticky="ew", pady=(0, 10))
 
+        # filters are applied in SQL
+        self.filter_frame = customtkinter.CTkFrame(self.dropdown_frame, fg_color=self.default_color)
+        self.filter_frame.pack(fill="x", pady=(0, 5))
+        self.mode_filter = customtkinter.CTkOptionMenu(self.filter_frame, values=MODES, width=110,
+                                                       command=lambda _: self.populate_dropdown())
+        self.mode_filter.pack(side="left", padx=(0, 5))
+        self.date_from_entry = customtkinter.CTkEntry(self.filter_frame, placeholder_text="From YYYY-MM-DD", width=140)
+        self.date_from_entry.pack(side="left", padx=(0, 5))
+        self.date_to_entry = customtkinter.CTkEntry(self.filter_frame, placeholder_text="To YYYY-MM-DD", width=140)
+        self.date_to_entry.pack(side="left", padx=(0, 5))
+        customtkinter.CTkButton(self.filter_frame, text="Filter", width=70,
+                                command=self.populate_dropdown).pack(side="left")
+        self.entry_border_color = self.date_from_entry.cget("border_color")
+
         self.dropdown_button = customtkinter.CTkButton(
             self.dropdown_frame, text="Select Session", command=self.toggle_dropdown
         )
         self.dropdown_button.pack(fill="x")
 
-        self.dropdown_list_frame = None
+        # one page of session buttons, reused for every page
+        self.dropdown_list_frame = customtkinter.CTkScrollableFrame(self, height=150, fg_color=self.default_color)
         self.dropdown_open = False
-        self.dropdown_values = ["No data"]
+        self.session_buttons = []
+        self.page_rows = []
+        self.page_cursors = [None]  # keyset cursor of every page up to the current one
+        self.has_more = False
+
+        self.page_nav_frame = customtkinter.CTkFrame(self.dropdown_list_frame, fg_color=self.default_color)
+        self.newer_button = customtkinter.CTkButton(self.page_nav_frame, text="‹ Newer", width=80,
+                                                    command=self.newer_page)
+        self.newer_button.pack(side="left")
+        self.older_button = customtkinter.CTkButton(self.page_nav_frame, text="Load older ›", width=80,
+                                                    command=self.older_page)
+        self.older_button.pack(side="right")
 
-        # === Scrollable Frame ===
-        self.scrollable_frame = customtkinter.CTkScrollableFrame(self, fg_color=self.default_color, bg_color=self.default_color)
-        self.scrollable_frame.grid(row=2, column=0, sticky="nsew", pady=(0, 10))
-        self.scrollable_frame.grid_columnconfigure(0, weight=1)
+        # === Results Table, only the rows in view have widgets ===
+        self.results_table = VirtualTable(
+            self, ["Reference", "Measured", "Δ (Diff)", "STD", "Frequency", "Timestamp", "Type"]
+        )
+        self.results_table.grid(row=2, column=0, sticky="nsew", pady=(0, 10))
+
+        # === Drift Table, per reference point across every session ===
+        self.drift_table = VirtualTable(
+            self, ["Mode", "Reference", "Frequency", "Sessions", "Mean Δ", "STD Δ", "Last value", "Min Δ", "Max Δ",
+                   "Last Δ", "Last measured"]
+        )
 
         self.populate_dropdown()
 
     def toggle_dropdown(self):
         if self.dropdown_open:
-            self.dropdown_list_frame.destroy()
+            self.dropdown_list_frame.grid_remove()
             self.dropdown_open = False
         else:
-            self.dropdown_list_frame = customtkinter.CTkScrollableFrame(self, height=150, fg_color=self.default_color)
             self.dropdown_list_frame.grid(row=3, column=0, sticky="ew")
             self.dropdown_open = True
 
-            for option in self.dropdown_values:
-                btn = customtkinter.CTkButton(
-                    self.dropdown_list_frame,
-                    text=option,
-                    anchor="w",
-                    command=lambda opt=option: self.select_dropdown_option(opt),
-                    fg_color="transparent",
-                    hover_color=self.hover_color,
-                    text_color=self.text_color
-                )
-                btn.pack(fill="x", pady=1)
-
-    def select_dropdown_option(self, option):
+    def select_dropdown_option(self, option, calib_id):
         self.dropdown_button.configure(text=option)
-        self.load_session(option)
-        if self.dropdown_list_frame:
-            self.dropdown_list_frame.destroy()
+        self.load_session(calib_id)
+        if self.dropdown_open:
+            self.dropdown_list_frame.grid_remove()
             self.dropdown_open = False
 
+    def read_date(self, entry):
+        """ Date filter from an entry, None when empty. Invalid dates are outlined and ignored. """
+        text = entry.get().strip()
+        valid = True
+        if text:
+            try:
+                datetime.strptime(text, "%Y-%m-%d")
+            except ValueError:
+                valid = False
+        entry.configure(border_color=self.entry_border_color if valid else "red")
+        return text if text and valid else None
+
+    def load_page(self):
+        """ Fetch the page starting at the last cursor and show it in the pooled buttons """
+        mode = self.mode_filter.get()
+        rows = fetch_sessions(self.database, after=self.page_cursors[-1],
+                              mode=None if mode == MODES[0] else mode,
+                              date_from=self.read_date(self.date_from_entry),
+                              date_to=self.read_date(self.date_to_entry),
+                              limit=PAGE_SIZE + 1, archive=self.archive)
+        self.has_more = len(rows) > PAGE_SIZE
+        self.page_rows = rows[:PAGE_SIZE]
+
+        options = [f"ID {row[0]}: {row[1]} at {row[2]}" for row in self.page_rows] or ["No calibrations found"]
+        while len(self.session_buttons) < len(options):
+            self.session_buttons.append(customtkinter.CTkButton(
+                self.dropdown_list_frame,
+                anchor="w",
+                fg_color="transparent",
+                hover_color=self.hover_color,
+                text_color=self.text_color
+            ))
+
+        self.page_nav_frame.pack_forget()
+        for btn, option, row in zip(self.session_buttons, options, self.page_rows):
+            btn.configure(text=option, command=lambda opt=option, calib_id=row[0]: self.select_dropdown_option(opt, calib_id))
+            btn.pack(fill="x", pady=1)
+        if not self.page_rows:
+            self.session_buttons[0].configure(text=options[0], command=lambda: None)
+            self.session_buttons[0].pack(fill="x", pady=1)
+        for btn in self.session_buttons[len(options):]:
+            btn.pack_forget()
+
+        self.newer_button.configure(state="normal" if len(self.page_cursors) > 1 else "disabled")
+        self.older_button.configure(state="normal" if self.has_more else "disabled")
+        self.page_nav_frame.pack(fill="x", pady=(5, 0))
+        return options
+
+    def older_page(self):
+        if self.has_more:
+            self.page_cursors.append(session_cursor(self.page_rows[-1]))
+            self.load_page()
+
+    def newer_page(self):
+        if len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            self.load_page()
+
     def populate_dropdown(self):
-        cursor = self.database.cursor()
-        cursor.execute("SELECT id, method_type, created_at FROM calibrations ORDER BY created_at DESC")
-        results = cursor.fetchall()
+        """ Back to the newest page for the current filters """
+        self.page_cursors = [None]
+        options = self.load_page()
+        self.dropdown_button.configure(text=options[0])
+
+    def start_export(self):
+        """ Export the sessions matching the filters, pressing again while it runs cancels it """
+        if self.export_job is not None and not self.export_job.finished:
+            self.export_job.cancel()
+            return
 
-        if results:
-            self.dropdown_values = [f"ID {row[0]}: {row[1]} at {row[2]}" for row in results]
+        export_format = self.export_format.get()
+        _, extension = EXPORT_FORMATS[export_format]
+        if extension:
+            path = filedialog.asksaveasfilename(defaultextension=extension,
+                                                filetypes=[(export_format, f"*{extension}")])
         else:
-            self.dropdown_values = ["No calibrations found"]
+            # one .npy file per column
+            path = filedialog.askdirectory(title="Export directory")
+        if not path:
+            return
 
-        self.dropdown_button.configure(text=self.dropdown_values[0])
+        mode = self.mode_filter.get()
+        self.export_job = ExportJob(self.db_name, path, export_format, archive=self.archive,
+                                    mode=None if mode == MODES[0] else mode,
+                                    date_from=self.read_date(self.date_from_entry),
+                                    date_to=self.read_date(self.date_to_entry),
+                                    include_samples=True).start()
+        self.export_button.configure(text="Cancel")
+        self.export_progress.set(0)
+        self.export_frame.grid(row=4, column=0, sticky="ew", pady=(0, 5))
+        self.after(100, self.poll_export)
 
-    def load_session(self, session_name):
-        if session_name.startswith("ID "):
-            calib_id = int(session_name.split(":")[0].replace("ID", "").strip())
-        else:
+    def poll_export(self):
+        job = self.export_job
+        if job.total:
+            self.export_progress.set(job.done / job.total)
+        self.export_status.configure(text=f"{job.done}/{job.total if job.total is not None else '?'} sessions, "
+                                          f"{job.rows} rows")
+        if not job.finished:
+            self.after(100, self.poll_export)
             return
 
-        cursor = self.database.cursor()
-
-        # Get method type
-        cursor.execute("SELECT method_type FROM calibrations WHERE id = ?", (calib_id,))
-        method_row = cursor.fetchone()
-        method_type = method_row[0] if method_row else None
-
-        # Fetch regular measurements
-        cursor.execute("""
-            SELECT set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp
-            FROM measurements
-            WHERE calibration_id = ?
-            ORDER BY timestamp
-        """, (calib_id,))
-        results = [(*row, "measurement") for row in cursor.fetchall()]
-
-        # Fetch colinearity if needed
-        colinearity_results = []
-        if method_type in ("DCV", "ACV"):
-            cursor.execute("""
-                SELECT linear_ref, measurement, linear_diff, linear_std, unit, NULL as frequency, timestamp
-                FROM colinearity
-                WHERE calibration_id = ?
-                ORDER BY timestamp
-            """, (calib_id,))
-            colinearity_results = [(*row, "linear_measurement") for row in cursor.fetchall()]
-
-        # Merge all
-        combined_results = results + colinearity_results
-
-        # Clear frame
-        for widget in self.scrollable_frame.winfo_children():
-            widget.destroy()
-
-        if combined_results:
-            headers = ["Reference", "Measured", "Δ (Diff)", "STD", "Frequency", "Timestamp", "Type"]
-            for idx, header in enumerate(headers):
-                customtkinter.CTkLabel(
-                    self.scrollable_frame, text=header,
-                    font=customtkinter.CTkFont(size=14, weight="bold")
-                ).grid(row=0, column=idx, padx=10, pady=(0, 5), sticky="w")
-
-            for row_idx, row in enumerate(combined_results, start=1):
-                set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp, row_type = row
-                if row_type == "measurement":
-                    values = [
-                        f"{set_value} {unit}",
-                        f"{calculated_value} {unit}",
-                        f"{ref_set_diff} {unit}",
-                        f"{std} {unit}",
-                        frequency or "/",
-                        timestamp,
-                        row_type
-                    ]
-                else:
-                    values = [
-                        f"{set_value} {unit}",
-                        f"{calculated_value} V",
-                        f"{ref_set_diff} V",
-                        f"{std} V",
-                        frequency or "/",
-                        timestamp,
-                        row_type
-                    ]
-
-                for col_idx, val in enumerate(values):
-                    customtkinter.CTkLabel(
-                        self.scrollable_frame, text=val,
-                        font=customtkinter.CTkFont(size=13)
-                    ).grid(row=row_idx, column=col_idx, padx=10, pady=2, sticky="w")
+        self.export_button.configure(text="Export")
+        if job.error is not None:
+            self.export_status.configure(text=f"Export failed: {job.error}")
+        elif job.cancelled.is_set():
+            self.export_status.configure(text=f"Export cancelled after {job.rows} rows")
         else:
-            customtkinter.CTkLabel(
-                self.scrollable_frame,
-                text="No measurements found.",
-                font=customtkinter.CTkFont(size=14)
-            ).grid(row=0, column=0, sticky="w", padx=10, pady=5)
+            self.export_status.configure(text=f"Exported {job.rows} rows to {job.path}")
+
+    def toggle_drift(self):
+        if self.showing_drift:
+            self.show_results()
+        else:
+            self.show_drift()
+
+    def show_results(self):
+        self.drift_table.grid_remove()
+        self.results_table.grid(row=2, column=0, sticky="nsew", pady=(0, 10))
+        self.drift_button.configure(text="Drift")
+        self.showing_drift = False
+
+    def show_drift(self):
+        """ Drift of every reference point, read from the incrementally kept summary only """
+        mode = self.mode_filter.get()
+        rows = []
+        sort_keys = []
+        for (method_type, set_value, unit, frequency, count, mean_diff, std_diff, min_diff, max_diff, last_diff,
+             last_value, last_timestamp) in fetch_drift(self.database, None if mode == MODES[0] else mode):
+            rows.append((
+                method_type or "/",
+                f"{set_value} {unit}",
+                frequency or "/",
+                str(count),
+                f"{mean_diff:.6g} {unit}",
+                f"{std_diff:.3g} {unit}",
+                f"{last_value:.6g} {unit}" if last_value is not None else "/",
+                f"{min_diff:.6g} {unit}",
+                f"{max_diff:.6g} {unit}",
+                f"{last_diff:.6g} {unit}",
+                format_timestamp(last_timestamp)
+            ))
+            sort_keys.append((method_type, set_value, frequency, count, mean_diff, std_diff, last_value, min_diff,
+                              max_diff, last_diff, last_timestamp))
+        self.drift_table.set_rows(rows, sort_keys)
 
+        self.results_table.grid_remove()
+        self.drift_table.grid(row=2, column=0, sticky="nsew", pady=(0, 10))
+        self.drift_button.configure(text="Session")
+        self.showing_drift = True
 
+    def load_session(self, calib_id):
+        # recently viewed sessions come from the cache, their neighbours in the list are loaded in the background
+        rows, sort_keys = self.session_cache.get(calib_id, self.database)
+        self.results_table.set_rows(rows, sort_keys)
+        self.show_results()
 
+        ids = [row[0] for row in self.page_rows]
+        if calib_id in ids:
+            position = ids.index(calib_id)
+            self.session_cache.prefetch(ids[max(0, position - 1):position] + ids[position + 1:position + 2])
@@ -1,15 +1,15 @@
 import tkinter
-import traceback
 
 import customtkinter
 import numpy as np
-from colorama import Fore, Style
 from matplotlib import pyplot as plt
-from matplotlib.animation import FuncAnimation
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from Utils.LivePlot import LivePlotData, minmax_decimate, views_for
 from Utils.color_theme import COLORS
 
+CURVE_COLORS = ["cyan", "orange", "violet", "gold", "salmon", "deepskyblue"]
+
 
 class GraphComponent(customtkinter.CTkFrame):
     """ Real-time updating graph component (Uses CustomTkinter default background) """
@@ -51,38 +51,19 @@ class GraphComponent(customtkinter.CTkFrame):
         shared_btn_width = 40
         shared_btn_height = 26
 
-        # Default: only one value
-        self.actual_values = []
-        self.time_values = []
-        self.data_sets = [self.actual_values]
-        self.labels = ["Measured values"]
+        # points of every series since the last clear, the graph shows the curves of one view at a time
+        self.data = LivePlotData()
+        self.views = views_for(mode)
         self.selected_index = 0
 
-        self.max_points = 10
-
-        self.value_data_labels = []
-
-        # If multiple data types are added, show controls. For now, skip them
-        if len(self.labels) > 1:
-            self.left_button = customtkinter.CTkButton(
-                self.bottom_control_frame, text="◀", width=shared_btn_width,
-                height=shared_btn_height, command=self.switch_left)
-            self.left_button.grid(row=0, column=0, padx=5)
-
-            self.display_label = customtkinter.CTkLabel(
-                self.bottom_control_frame, text=self.labels[self.selected_index],
-                font=customtkinter.CTkFont(size=14))
-            self.display_label.grid(row=0, column=1, padx=5)
-
-            self.right_button = customtkinter.CTkButton(
-                self.bottom_control_frame, text="▶", width=shared_btn_width,
-                height=shared_btn_height, command=self.switch_right)
-            self.right_button.grid(row=0, column=2, padx=5)
-
-            spacer_col = 3
-        else:
-            spacer_col = 0
-
+        self.left_button = customtkinter.CTkButton(
+            self.bottom_control_frame, text="◀", width=shared_btn_width,
+            height=shared_btn_height, command=self.switch_left)
+        self.display_label = customtkinter.CTkLabel(
+            self.bottom_control_frame, text="", font=customtkinter.CTkFont(size=14))
+        self.right_button = customtkinter.CTkButton(
+            self.bottom_control_frame, text="▶", width=shared_btn_width,
+            height=shared_btn_height, command=self.switch_right)
 
         # === Value Label (always shown) ===
         self.value_label = customtkinter.CTkLabel(
@@ -90,89 +71,214 @@ class GraphComponent(customtkinter.CTkFrame):
         self.value_label.grid(row=1, column=0, columnspan=7, pady=(5, 5))
         self.value_data_labels = [self.value_label]
 
-        # Start graph animation
-        self.ani = FuncAnimation(self.figure, self.update_graph, interval=1000)
+        # Artists are created once per curve and only get new data. Curves are animated and blitted over a saved
+        # background, the axes, grid, reference line and legend are only redrawn when the limits or view change.
+        self.ax.grid(True, which='both', color='gray', linestyle='--', linewidth=0.5)
+        self.artists = {}  # (view key, curve) -> (line, std band or None)
+        self.reference_line, = self.ax.plot([], [], linestyle="--", linewidth=1.5)
+        self.legend = None
+        self.background = None
+        self.dirty = False
+        self.show_view()
 
-    def update_data(self, values):
-        print("Showing for",values)
-        print("Currently", self.data_sets)
-        """ Store new data points and update the graph """
-        self.time_values.append(values[0]["Step"])
-        for i, val in enumerate(values):
-            self.data_sets[i].append(val["Value"])
-            raw_val = val['Value']
-            """value_str = raw_val if isinstance(raw_val, str) else f"{float(raw_val):.2f}"
-            if i < len(self.value_data_labels):
-                self.value_data_labels[i].configure(text=f"{value_str} {val['Label']}")"""
+        # a full draw (first show, resize, new limits) refreshes the background, showing the tab draws pending data
+        self.canvas.mpl_connect("draw_event", self.on_draw)
+        tkinter.Frame.bind(self, "<Map>", lambda event: self.after_idle(self.redraw))
 
+    def update_data(self, values):
+        """ Store new data points, the graph is redrawn if it is visible. Points go to their "View" and "Curve",
+        by default the first view's measured curve, "Std" adds a band around it. """
+        for val in values:
+            self.data.add(val.get("View", self.views[0].key), val.get("Curve", "Measured"), val["Step"],
+                          val["Value"], val.get("Std"))
+        self.dirty = True
+        self.redraw()
 
     def update_mode(self,mode):
-        self.clear_graph()
         self.selected_mode = mode
+        self.views = views_for(mode)
+        self.selected_index = 0
+        # curves differ between modes, e.g. one per frequency for AC
+        for line, band in self.artists.values():
+            line.remove()
+            if band is not None:
+                band.remove()
+        self.artists = {}
+        self.data.clear()
+        self.show_view()
 
     def clear_graph(self):
         """Clear all graph data and reset the display."""
-        # Clear stored data
-        self.time_values = []
-        self.actual_values = []
-        self.data_sets = [self.actual_values]
-
-        # Clear plot
-        self.ax.clear()
+        self.data.clear()
+        self.dirty = True
+        self.update_graph()
+
+    def switch_left(self):
+        self.selected_index = (self.selected_index - 1) % len(self.views)
+        self.show_view()
+
+    def switch_right(self):
+        self.selected_index = (self.selected_index + 1) % len(self.views)
+        self.show_view()
+
+    def show_view(self):
+        """ Axis labels, reference line and controls of the selected view """
+        view = self.views[self.selected_index]
+        self.ax.set_xlabel(view.xlabel)
+        self.ax.set_ylabel(view.ylabel)
+        if view.xlim is not None:
+            self.ax.set_xlim(*view.xlim)
+        if view.reference == "identity":
+            self.reference_line.set_color("lightgreen")
+            self.reference_line.set_label("Linear reference")
+        elif view.reference == "zero":
+            self.reference_line.set_color("gray")
+            self.reference_line.set_label("No error")
+        else:
+            self.reference_line.set_color("orange")
+            self.reference_line.set_label(f"Reference at {view.reference} V")
+        for (key, _), (line, band) in self.artists.items():
+            line.set_visible(key == view.key)
+            if band is not None:
+                band.set_visible(key == view.key)
+
+        if len(self.views) > 1:
+            self.left_button.grid(row=0, column=0, padx=5)
+            self.display_label.grid(row=0, column=1, padx=5)
+            self.right_button.grid(row=0, column=2, padx=5)
+            self.display_label.configure(text=view.title)
+        else:
+            self.left_button.grid_remove()
+            self.display_label.grid_remove()
+            self.right_button.grid_remove()
+        self.legend_stale = True
+        self.update_graph()
+
+    def curve_artists(self, view, curve, with_band):
+        """ Line (and std band) of a curve, created the first time it has points """
+        artists = self.artists.get((view, curve))
+        if artists is None or (with_band and artists[1] is None):
+            line, band = artists if artists is not None else (None, None)
+            color = CURVE_COLORS[sum(key == view for key, _ in self.artists) % len(CURVE_COLORS)]
+            if line is None:
+                line, = self.ax.plot([], [], marker="o", markersize=4, linewidth=1, color=color, label=curve,
+                                     animated=True)
+            if with_band:
+                band = self.ax.fill_between([], [], [], color=line.get_color(), alpha=0.25, linewidth=0,
+                                            label=f"{curve} ± std", animated=True)
+            artists = self.artists[(view, curve)] = (line, band)
+            self.legend_stale = True
+        return artists
+
+    def prepare(self):
+        """ Hand the decimated points of the selected view to its artists, returns (x, y) data bounds or None """
+        view = self.views[self.selected_index]
+        buckets = max(int(self.ax.bbox.width), 100)
+        bounds = []
+        for curve, buffer in self.data.curves(view.key):
+            rows = buffer.view()
+            if not len(rows):
+                line, band = self.artists.get((view.key, curve), (None, None))
+                if line is not None:
+                    line.set_data([], [])
+                if band is not None:
+                    band.set_verts([])
+                continue
+            has_std = bool(np.isfinite(rows[:, 2]).any())
+            line, band = self.curve_artists(view.key, curve, has_std)
+
+            # at most two points per pixel column, the cost of drawing does not grow with the history
+            x, y, std = rows[minmax_decimate(rows[:, 1], buckets)].T
+            line.set_data(x, y)
+            if band is not None:
+                finite = np.isfinite(std)
+                x, upper, lower = x[finite], (y + std)[finite], (y - std)[finite]
+                band.set_verts([np.concatenate((np.column_stack((x, upper)), np.column_stack((x[::-1], lower[::-1]))))]
+                               if x.size else [])
+            spread = np.nan_to_num(rows[:, 2])
+            bounds.append((np.nanmin(rows[:, 0]), np.nanmax(rows[:, 0]),
+                           np.nanmin(rows[:, 1] - spread), np.nanmax(rows[:, 1] + spread)))
+        if not bounds:
+            return None
+        bounds = np.array(bounds)
+        return (bounds[:, 0].min(), bounds[:, 1].max()), (bounds[:, 2].min(), bounds[:, 3].max())
+
+    def fit_limits(self, bounds):
+        """ Move the view to the data, returns True if the limits changed """
+        if bounds is None or not np.isfinite(bounds).all():
+            return False
+        view = self.views[self.selected_index]
+        changed = False
+        for (low, high), get_limits, set_limits, fixed in ((bounds[0], self.ax.get_xlim, self.ax.set_xlim, view.xlim),
+                                                          (bounds[1], self.ax.get_ylim, self.ax.set_ylim, None)):
+            if fixed is not None:
+                continue
+            margin = 0.05 * (high - low) or 0.5
+            wanted = (low - margin, high + margin)
+            current = get_limits()
+            # keep the view while the points fit in it and fill at least half of it, growing data gets a quarter
+            # of headroom on each side so new points rarely force a full redraw
+            span = current[1] - current[0]
+            fits = current[0] <= wanted[0] and wanted[1] <= current[1]
+            if not fits or (wanted[1] - wanted[0]) < 0.5 * span:
+                headroom = 0.25 * (wanted[1] - wanted[0]) if not fits else 0
+                set_limits(wanted[0] - headroom, wanted[1] + headroom)
+                changed = True
+        return changed
+
+    def update_static(self):
+        """ Reference line across the current limits and a legend of the visible curves """
+        view = self.views[self.selected_index]
+        xlim = np.array(self.ax.get_xlim())
+        if view.reference == "identity":
+            self.reference_line.set_data(xlim, xlim)
+        elif view.reference == "zero":
+            self.reference_line.set_data(xlim, [0, 0])
+        else:
+            self.reference_line.set_data(xlim, [view.reference, view.reference])
 
-        # Optionally reset axis labels
-        self.ax.set_xlabel("")
-        self.ax.set_ylabel("")
+        if self.legend_stale:
+            handles = [self.reference_line]
+            for (key, _), (line, band) in self.artists.items():
+                if key == view.key:
+                    handles += [line] + ([band] if band is not None else [])
+            if self.legend is not None:
+                self.legend.remove()
+            self.legend = self.ax.legend(handles=handles)
+            self.legend_stale = False
 
-        # Redraw the empty canvas
-        self.canvas.draw()
+    def is_visible(self):
+        return bool(self.canvas.get_tk_widget().winfo_viewable())
 
     def update_graph(self, frame=None):
-        """ Update the graph display with points and a fitted or fixed line depending on mode """
-        self.ax.clear()
-        data = self.data_sets[self.selected_index]
-        time = self.time_values
-
-        if self.max_points is not None:
-            data = data[-self.max_points:]
-            time = time[-self.max_points:]
-
-        # Plot points
-        self.ax.scatter(time, data, label=self.labels[self.selected_index], color="cyan", s=20)
-
-        # Mode-dependent line
-        try:
-            if self.selected_mode == "ACV":
-                self.ax.set_xlabel("Set frequency [Hz]")
-                self.ax.set_ylabel("Measured voltage [V]")
-
-                self.ax.set_xlim(0, 110)  # shows x-axis from 0 to 50
-                # Flat line at 10
-
-                x_vals = np.arange(10,100)
-                y_vals = np.full_like(x_vals, 10)
-                self.ax.plot(x_vals, y_vals, color="orange", linestyle="--", linewidth=1.5, label="Reference at 10 V")
-
-            elif self.selected_mode == "DCV":
-                self.ax.set_xlabel("Set voltage [V]")
-                self.ax.set_ylabel("Mesured voltage [V]")
-                x_vals = np.arange(0, 10)  # Fallback to (1,1), (2,2), ..., (5,5)
-
-                y_vals = x_vals
-
-                self.ax.plot(x_vals, y_vals, color="lightgreen", linestyle="--", linewidth=1.5, label="Linear reference")
-
-        except Exception as e:
-            print("Graph line drawing failed:", e)
-            print(Fore.RED + Style.BRIGHT + "Exception type: " + str(type(e)))
-            print(Fore.YELLOW + Style.BRIGHT + "Exception message: " + str(e))
-            print(Fore.CYAN + Style.BRIGHT + "Traceback:")
-            traceback_lines = traceback.format_exception(type(e), e, e.__traceback__)
-            for line in traceback_lines:
-                print(Fore.CYAN + line, end='')
-
-
-        self.ax.grid(True, which='both', color='gray', linestyle='--', linewidth=0.5)
-        self.ax.legend()
-        self.canvas.draw()
-
+        """ Full redraw of the graph, needed after the limits or view change """
+        self.fit_limits(self.prepare())
+        self.update_static()
+        self.dirty = False
+        self.canvas.draw_idle()
+
+    def redraw(self):
+        """ Draw pending points, blitting only the curves unless the limits or legend have to change """
+        if not self.dirty or not self.is_visible():
+            return
+        self.dirty = False
+        if self.fit_limits(self.prepare()) or self.legend_stale or self.background is None:
+            self.update_static()
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self.draw_curves()
+        self.canvas.blit(self.ax.bbox)
+
+    def draw_curves(self):
+        view = self.views[self.selected_index]
+        for (key, _), (line, band) in self.artists.items():
+            if key == view.key:
+                if band is not None:
+                    self.ax.draw_artist(band)
+                self.ax.draw_artist(line)
+
+    def on_draw(self, event):
+        """ Save the static layer after every full draw and put the animated curves back on it """
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw_curves()
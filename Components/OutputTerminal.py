@@ -1,11 +1,18 @@
+import logging
+import queue
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
 import customtkinter
 
 from Utils.color_theme import COLORS
 
+LEVELS = {"All": logging.DEBUG, "Info": logging.INFO, "Warnings": logging.WARNING, "Errors": logging.ERROR}
+
 
 class TerminalOutput(customtkinter.CTkFrame):
-    """ Terminal output log component """
-    def __init__(self, parent):
+    """ Terminal output log component, keeps the newest lines on screen and the full log in a rotating file """
+    def __init__(self, parent, dispatcher=None, capacity=5000, log_path="calibration.log"):
 
         self.default_color = COLORS["backgroundLight"]
         self.active_color = COLORS["backgroundDark"]
@@ -20,15 +27,87 @@ class TerminalOutput(customtkinter.CTkFrame):
         self.top_spacer = customtkinter.CTkFrame(self, height=10, fg_color=self.default_color, corner_radius=0)
         self.top_spacer.grid(row=0, column=0, sticky="ew")
 
+        # lines below this level are kept in the buffer and file but not shown
+        self.level = logging.DEBUG
+        self.level_filter = customtkinter.CTkOptionMenu(self.top_spacer, values=list(LEVELS), width=100, height=20,
+                                                        command=lambda name: self.set_level(LEVELS[name]))
+        self.level_filter.pack(side="right", padx=(0, 20), pady=(0, 2))
+
         # === Read-only Textbox ===
         self.textbox = customtkinter.CTkTextbox(self, corner_radius=5,fg_color=self.active_color,border_spacing=10)
         self.textbox.grid(row=1, column=0, padx=(0,20), pady=(0, 0), sticky="nsew",)
         # Make it visually read-only
         self.textbox.configure(state="disabled")
 
-    def log(self, message):
-        """ Add message to the terminal output """
+        # messages from other threads are handed to the Tk thread and written once per frame
+        self.dispatcher = dispatcher
+
+        # ring buffer of (level, message, line count), it and the widget hold at most capacity lines, counted as
+        # inserted, so a message with newlines counts as several
+        self.capacity = capacity
+        self.lines = deque()
+        self.buffered = 0  # lines in the ring buffer
+        self.shown = 0  # lines in the widget
+
+        # the file gets every line, written by the listener thread so logging never waits on the disk
+        self.logger = logging.getLogger("calibration.terminal")
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+        file_handler = RotatingFileHandler(log_path, maxBytes=5 * 2 ** 20, backupCount=5, encoding="utf-8",
+                                           delay=True)
+        file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+        log_queue = queue.SimpleQueue()
+        self.queue_handler = QueueHandler(log_queue)
+        self.logger.addHandler(self.queue_handler)
+        self.listener = QueueListener(log_queue, file_handler)
+        self.listener.start()
+
+    def log(self, message, level=logging.INFO):
+        """ Add message to the terminal output, from any thread """
+        self.logger.log(level, message)
+        if self.dispatcher is not None and not self.dispatcher.on_ui_thread():
+            self.dispatcher.post("log", (level, message))
+            return
+        self.write_lines([(level, message)])
+
+    def write_lines(self, entries):
+        """ Append several (level, message) entries with a single insert, Tk thread only """
+        entries = [(level, str(message), str(message).count("\n") + 1) for level, message in entries]
+        self.lines.extend(entries)
+        self.buffered += sum(count for _, _, count in entries)
+        # the newest message is always kept, however many lines it has
+        while self.buffered > self.capacity and len(self.lines) > 1:
+            self.buffered -= self.lines.popleft()[2]
+
+        visible = [(message, count) for level, message, count in entries if level >= self.level]
+        if not visible:
+            return
         self.textbox.configure(state="normal")
-        self.textbox.insert("end", message + "\n")
-        self.textbox.yview_moveto(1)
+        self.show(visible)
+        self.textbox.configure(state="disabled")
+
+    def set_level(self, level):
+        """ Show only lines at or above level, redrawn from the ring buffer """
+        self.level = level
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", "end")
+        self.shown = 0
+        self.show([(message, count) for line_level, message, count in self.lines if line_level >= level])
         self.textbox.configure(state="disabled")
+
+    def show(self, visible):
+        """ Insert (message, line count) pairs at the end and trim the widget back to capacity lines """
+        if visible:
+            self.textbox.insert("end", "\n".join(message for message, _ in visible) + "\n")
+            self.shown += sum(count for _, count in visible)
+        if self.shown > self.capacity:
+            # drop the oldest lines in one delete
+            excess = self.shown - self.capacity
+            self.textbox.delete("1.0", f"{excess + 1}.0")
+            self.shown = self.capacity
+        self.textbox.yview_moveto(1)
+
+    def close(self):
+        """ Write out whatever the file listener still has queued """
+        self.listener.stop()
+        self.logger.removeHandler(self.queue_handler)
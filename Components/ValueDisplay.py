@@ -1,9 +1,20 @@
+import tkinter
+
 import customtkinter
 from Utils.color_theme import COLORS
 
 
 class ValueDisplay(customtkinter.CTkFrame):
-    """ Displays real-time values with labels, supporting single, double, and triple layouts."""
+    """ Displays real-time values with labels, supporting single, double, and triple layouts.
+    All blocks are text items on one canvas, an item is only reconfigured when its text changes. """
+
+    BLOCKS_PER_ROW = 3
+    BLOCK_WIDTH = 360
+    BLOCK_HEIGHT = 112
+    # (y offset in a block, font) of the header, value, difference and std lines
+    LINES = ((10, "header"), (42, "value"), (64, "diff"), (86, "std"))
+    FONTS = {"header": (15, "bold"), "value": (13, "bold"), "diff": (14, "normal"), "std": (12, "normal")}
+    CACHE_LIMIT = 4096
 
     def __init__(self, parent, running):
         super().__init__(parent, fg_color=COLORS["backgroundLight"])
@@ -12,102 +23,27 @@ class ValueDisplay(customtkinter.CTkFrame):
         self.vals = []
         self.diffs = []
         self.stds = []
-        self.single_mode_flags = []
-        self.triple_mode_flags = []
 
         self.grid(row=1, column=1, padx=(20, 20), pady=(10, 80), sticky="nsew")
+        self.grid_columnconfigure(0, weight=1)
 
-        columns_per_row = 3
-        total_columns = columns_per_row * 3
-        for c in range(total_columns):
-            self.grid_columnconfigure(c, weight=1)
-
-        header_width = 160
-        label_width = 100
-        label_value_size = 13
-        padx = 10
-
-        self.headers = []
-        self.value_labels = []
-        self.diff_labels = []
-        self.std_labels = []
-
-        self.single_value_labels = []
-        self.single_diff_labels = []
-        self.single_std_labels = []
-
-        self.pair_indices = []
-
-        used_indices = set()
-        column = 0
-        row_block = 0
-
-        num_blocks = 7  # Always create 7 blocks
-        column = 0
-        row_block = 0
-
-        for block_index in range(num_blocks):
-            self.pair_indices.append((None, None, None))  # Dummy placeholders
-
-            header = customtkinter.CTkLabel(self, text=f"Measured at --",
-                                            font=customtkinter.CTkFont(size=15, weight="bold"),
-                                            width=header_width)
-            header.grid(row=row_block * 4, column=column, columnspan=3, padx=padx, pady=(10, 2), sticky="n")
-            self.headers.append(header)
-
-            for offset in range(3):
-                val_lbl = customtkinter.CTkLabel(self, text="--",
-                                                 font=customtkinter.CTkFont(size=label_value_size, weight="bold"),
-                                                 width=label_width)
-                diff_lbl = customtkinter.CTkLabel(self, text="Δ --",
-                                                  font=customtkinter.CTkFont(size=14),
-                                                  width=label_width)
-                std_lbl = customtkinter.CTkLabel(self, text="σ --",
-                                                 font=customtkinter.CTkFont(size=12),
-                                                 width=label_width)
-
-                val_lbl.grid(row=row_block * 4 + 1, column=column + offset, padx=padx, pady=(4, 2), sticky="n")
-                diff_lbl.grid(row=row_block * 4 + 2, column=column + offset, padx=padx, pady=(0, 2), sticky="n")
-                std_lbl.grid(row=row_block * 4 + 3, column=column + offset, padx=padx, pady=(0, 6), sticky="n")
-
-                self.value_labels.append(val_lbl)
-                self.diff_labels.append(diff_lbl)
-                self.std_labels.append(std_lbl)
-
-            single_val = customtkinter.CTkLabel(self, text="--",
-                                                font=customtkinter.CTkFont(size=label_value_size, weight="bold"),
-                                                width=label_width * 3)
-            single_diff = customtkinter.CTkLabel(self, text="Δ --",
-                                                 font=customtkinter.CTkFont(size=14),
-                                                 width=label_width * 3)
-            single_std = customtkinter.CTkLabel(self, text="σ --",
-                                                font=customtkinter.CTkFont(size=12),
-                                                width=label_width * 3)
-
-            single_val.grid(row=row_block * 4 + 1, column=column, columnspan=3, padx=padx, pady=(4, 2), sticky="n")
-            single_diff.grid(row=row_block * 4 + 2, column=column, columnspan=3, padx=padx, pady=(0, 2), sticky="n")
-            single_std.grid(row=row_block * 4 + 3, column=column, columnspan=3, padx=padx, pady=(0, 6), sticky="n")
-
-            single_val.grid_remove()
-            single_diff.grid_remove()
-            single_std.grid_remove()
-
-            self.single_value_labels.append(single_val)
-            self.single_diff_labels.append(single_diff)
-            self.single_std_labels.append(single_std)
-
-            column += 3
-            if column >= total_columns:
-                column = 0
-                row_block += 1
-
-        self.single_mode_flags = [False] * num_blocks
-        self.triple_mode_flags = [False] * num_blocks
+        self.fonts = {name: customtkinter.CTkFont(size=round(self._apply_widget_scaling(size)), weight=weight)
+                      for name, (size, weight) in self.FONTS.items()}
+        self.canvas = tkinter.Canvas(self, bg=COLORS["backgroundLight"], highlightthickness=0, borderwidth=0,
+                                     width=self._apply_widget_scaling(self.BLOCK_WIDTH * self.BLOCKS_PER_ROW),
+                                     height=self._apply_widget_scaling(self.BLOCK_HEIGHT))
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.canvas.bind("<Configure>", lambda event: self.place_items())
+
+        # blocks of (header item, [(value item, diff item, std item) per slot]), slots take values in order
+        self.blocks = []
+        self.texts = {}  # item -> text it shows
+        self.format_cache = {}  # precision -> {(prefix, value, unit): text}
 
         # Slider
         self.rounding_precision = customtkinter.IntVar(value=2)
         slider_frame = customtkinter.CTkFrame(self, fg_color="transparent")
-        slider_frame.grid(row=row_block * 5 + 3, column=0, columnspan=total_columns, pady=(10, 0), sticky="ew")
+        slider_frame.grid(row=1, column=0, pady=(10, 0), sticky="ew")
         slider_frame.grid_columnconfigure(0, weight=1)
         slider_frame.grid_columnconfigure(1, weight=0)
         slider_frame.grid_columnconfigure(2, weight=1)
@@ -127,54 +63,75 @@ class ValueDisplay(customtkinter.CTkFrame):
         )
         self.precision_value_label.grid(row=0, column=2, sticky="w")
 
-
     def update_slider_label(self, value):
         self.precision_value_label.configure(text=f"{int(float(value))} digits")
         if not self.running:
             self.update_values(self.vals, self.diffs, self.stds)
 
-    def switch_to_single(self, pair_index):
-        self.single_mode_flags[pair_index] = True
-        self.triple_mode_flags[pair_index] = False
-
-        for offset in range(3):
-            self.value_labels[pair_index * 3 + offset].grid_remove()
-            self.diff_labels[pair_index * 3 + offset].grid_remove()
-            self.std_labels[pair_index * 3 + offset].grid_remove()
-
-        self.single_value_labels[pair_index].grid()
-        self.single_diff_labels[pair_index].grid()
-        self.single_std_labels[pair_index].grid()
-
-    def switch_to_double(self, pair_index):
-        self.single_mode_flags[pair_index] = False
-        self.triple_mode_flags[pair_index] = False
-
-        self.single_value_labels[pair_index].grid_remove()
-        self.single_diff_labels[pair_index].grid_remove()
-        self.single_std_labels[pair_index].grid_remove()
-
-        for offset in range(2):
-            self.value_labels[pair_index * 3 + offset].grid()
-            self.diff_labels[pair_index * 3 + offset].grid()
-            self.std_labels[pair_index * 3 + offset].grid()
-
-        self.value_labels[pair_index * 3 + 2].grid_remove()
-        self.diff_labels[pair_index * 3 + 2].grid_remove()
-        self.std_labels[pair_index * 3 + 2].grid_remove()
-
-    def switch_to_triple(self, pair_index):
-        self.single_mode_flags[pair_index] = False
-        self.triple_mode_flags[pair_index] = True
-
-        self.single_value_labels[pair_index].grid_remove()
-        self.single_diff_labels[pair_index].grid_remove()
-        self.single_std_labels[pair_index].grid_remove()
+    def set_layout(self, blocks):
+        """ blocks is a list of (header, number of values 1 to 3), as many as the test plan needs """
+        self.canvas.delete("all")
+        self.texts = {}
+        self.blocks = []
+        for header, count in blocks:
+            header_item = self.add_text("header", header)
+            slots = [(self.add_text("value", "--"), self.add_text("diff", "Δ --"), self.add_text("std", "σ --"))
+                     for _ in range(count)]
+            self.blocks.append((header_item, slots))
+
+        rows = max(1, -(-len(blocks) // self.BLOCKS_PER_ROW))
+        self.canvas.configure(height=self._apply_widget_scaling(rows * self.BLOCK_HEIGHT))
+        self.place_items()
+
+    def add_text(self, font, text):
+        item = self.canvas.create_text(0, 0, text=text, font=self.fonts[font], fill=COLORS["text"], anchor="n")
+        self.texts[item] = text
+        return item
+
+    def place_items(self):
+        """ Move the items to the current canvas width, texts are left alone """
+        block_width = max(self.canvas.winfo_width(), 1) / self.BLOCKS_PER_ROW
+        if block_width <= 1:
+            block_width = self._apply_widget_scaling(self.BLOCK_WIDTH)
+        block_height = self._apply_widget_scaling(self.BLOCK_HEIGHT)
+        offsets = [self._apply_widget_scaling(offset) for offset, _ in self.LINES]
+        for block_index, (header_item, slots) in enumerate(self.blocks):
+            left = (block_index % self.BLOCKS_PER_ROW) * block_width
+            top = (block_index // self.BLOCKS_PER_ROW) * block_height
+            self.canvas.coords(header_item, left + block_width / 2, top + offsets[0])
+            for slot_index, items in enumerate(slots):
+                x = left + block_width * (2 * slot_index + 1) / (2 * len(slots))
+                for item, offset in zip(items, offsets[1:]):
+                    self.canvas.coords(item, x, top + offset)
+
+    def _set_scaling(self, *args, **kwargs):
+        # a plain canvas is not scaled by customtkinter, follow the widget scaling by hand
+        super()._set_scaling(*args, **kwargs)
+        for name, (size, _) in self.FONTS.items():
+            self.fonts[name].configure(size=round(self._apply_widget_scaling(size)))
+        rows = max(1, -(-len(self.blocks) // self.BLOCKS_PER_ROW))
+        self.canvas.configure(width=self._apply_widget_scaling(self.BLOCK_WIDTH * self.BLOCKS_PER_ROW),
+                              height=self._apply_widget_scaling(rows * self.BLOCK_HEIGHT))
+        self.place_items()
+
+    def format(self, prefix, value, unit, precision):
+        cache = self.format_cache.setdefault(precision, {})
+        key = (prefix, value, unit)
+        text = cache.get(key)
+        if text is None:
+            if len(cache) >= self.CACHE_LIMIT:
+                cache.clear()
+            try:
+                text = f"{prefix}{float(value):.{precision}f} {unit}"
+            except (TypeError, ValueError):
+                text = f"{prefix}--"
+            cache[key] = text
+        return text
 
-        for offset in range(3):
-            self.value_labels[pair_index * 3 + offset].grid()
-            self.diff_labels[pair_index * 3 + offset].grid()
-            self.std_labels[pair_index * 3 + offset].grid()
+    def set_text(self, item, text):
+        if self.texts.get(item) != text:
+            self.canvas.itemconfigure(item, text=text)
+            self.texts[item] = text
 
     def update_values(self, values, differences, stds):
         self.vals = values
@@ -183,40 +140,21 @@ class ValueDisplay(customtkinter.CTkFrame):
 
         precision = self.rounding_precision.get()
         value_i = 0
-
-        for pair_index in range(len(self.pair_indices)):
-            try:
-                if self.single_mode_flags[pair_index]:
-                    val = values[value_i]
-                    diff = differences[value_i]
-                    std = stds[value_i]
-                    label = val["Label"]
-
-                    self.single_value_labels[pair_index].configure(
-                        text=f"{float(val['Value']):.{precision}f} {label}")
-                    self.single_diff_labels[pair_index].configure(
-                        text=f"Δ {float(diff['Value']):.{precision}f} {label}")
-                    self.single_std_labels[pair_index].configure(
-                        text=f"σ {float(std['Value']):.{precision}f} {label}")
-
-                    value_i += 1
-
-                else:
-                    count = 3 if self.triple_mode_flags[pair_index] else 2
-                    for offset in range(count):
-                        val = values[value_i]
-                        diff = differences[value_i]
-                        std = stds[value_i]
-                        label = val["Label"]
-
-                        self.value_labels[pair_index * 3 + offset].configure(
-                            text=f"{float(val['Value']):.{precision}f} {label}")
-                        self.diff_labels[pair_index * 3 + offset].configure(
-                            text=f"Δ {float(diff['Value']):.{precision}f} {label}")
-                        self.std_labels[pair_index * 3 + offset].configure(
-                            text=f"σ {float(std['Value']):.{precision}f} {label}")
-
-                        value_i += 1
-
-            except Exception:
-                pass
+        for _, slots in self.blocks:
+            for value_item, diff_item, std_item in slots:
+                if value_i >= len(values):
+                    return
+                val = values[value_i]
+                unit = val["Label"]
+                self.set_text(value_item, self.format("", val["Value"], unit, precision))
+                self.set_text(diff_item, self.format("Δ ", differences[value_i]["Value"], unit, precision))
+                self.set_text(std_item, self.format("σ ", stds[value_i]["Value"], unit, precision))
+                value_i += 1
+
+    def clear(self):
+        """ Show -- in every slot """
+        for _, slots in self.blocks:
+            for value_item, diff_item, std_item in slots:
+                self.set_text(value_item, "--")
+                self.set_text(diff_item, "Δ --")
+                self.set_text(std_item, "σ --")
@@ -0,0 +1,162 @@
+import customtkinter
+
+from Utils.color_theme import COLORS
+
+
+class VirtualTable(customtkinter.CTkFrame):
+    """ Table that only builds widgets for the rows in view, scrolling reassigns row data to the same widgets """
+
+    def __init__(self, parent, headers, row_height=26):
+        self.default_color = COLORS["backgroundLight"]
+        self.hover_color = COLORS["hover"]
+        self.text_color = COLORS["lg_text"]
+
+        super().__init__(parent, fg_color=self.default_color, bg_color=self.default_color)
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.headers = headers
+        self.row_height = row_height
+        self.rows = []
+        self.sort_keys = []
+        self.order = range(0)  # display position -> row index
+        self.sort_column = None
+        self.sort_descending = False
+        self.top = 0  # row index shown in the first pooled row
+        self.row_widgets = []  # pool of (frame, [labels]), one per visible row
+
+        # one shared font instead of one per cell
+        self.header_font = customtkinter.CTkFont(size=14, weight="bold")
+        self.cell_font = customtkinter.CTkFont(size=13)
+
+        # === Header, click to sort ===
+        self.header_frame = customtkinter.CTkFrame(self, fg_color=self.default_color)
+        self.header_frame.grid(row=0, column=0, sticky="ew")
+        self.header_buttons = []
+        for idx, header in enumerate(headers):
+            self.header_frame.grid_columnconfigure(idx, weight=1, uniform="column")
+            btn = customtkinter.CTkButton(
+                self.header_frame, text=header, font=self.header_font, anchor="w",
+                fg_color="transparent", hover_color=self.hover_color, text_color=self.text_color,
+                command=lambda column=idx: self.sort_by(column)
+            )
+            btn.grid(row=0, column=idx, padx=2, pady=(0, 5), sticky="ew")
+            self.header_buttons.append(btn)
+
+        # === Body and scrollbar ===
+        self.body = customtkinter.CTkFrame(self, fg_color=self.default_color)
+        self.body.grid(row=1, column=0, sticky="nsew")
+        self.body.grid_columnconfigure(0, weight=1)
+        self.scrollbar = customtkinter.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+
+        self.empty_label = customtkinter.CTkLabel(self.body, text="No measurements found.",
+                                                  font=customtkinter.CTkFont(size=14))
+
+        self.body.bind("<Configure>", lambda event: self.resize_pool(event.height))
+        self.bind_wheel(self.body)
+
+    def bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda event: self.scroll_rows(-1 if event.delta > 0 else 1) or "break")
+        widget.bind("<Button-4>", lambda event: self.scroll_rows(-1) or "break")
+        widget.bind("<Button-5>", lambda event: self.scroll_rows(1) or "break")
+
+    def resize_pool(self, height):
+        """ Keep exactly enough row widgets to fill the body """
+        visible = max(1, height // self.row_height)
+        while len(self.row_widgets) < visible:
+            frame = customtkinter.CTkFrame(self.body, fg_color=self.default_color, height=self.row_height)
+            labels = []
+            for idx in range(len(self.headers)):
+                frame.grid_columnconfigure(idx, weight=1, uniform="column")
+                label = customtkinter.CTkLabel(frame, text="", font=self.cell_font, anchor="w",
+                                               height=self.row_height - 4)
+                label.grid(row=0, column=idx, padx=10, sticky="ew")
+                self.bind_wheel(label)
+                labels.append(label)
+            self.bind_wheel(frame)
+            self.row_widgets.append((frame, labels))
+        while len(self.row_widgets) > visible:
+            frame, _ = self.row_widgets.pop()
+            frame.destroy()
+        self.render()
+
+    def set_rows(self, rows, sort_keys=None):
+        """ rows are tuples of cell strings, sort_keys optional tuples of raw values to sort by instead """
+        self.rows = rows
+        self.sort_keys = sort_keys if sort_keys is not None else rows
+        self.order = range(len(rows))
+        self.sort_column = None
+        self.sort_descending = False
+        self.top = 0
+        self.update_header_arrows()
+        self.render()
+
+    def sort_by(self, column):
+        """ Sort the rows already loaded, clicking the same header again reverses the order """
+        if self.sort_column == column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+
+        def key(index):
+            value = self.sort_keys[index][column]
+            # missing values last, numbers before text
+            return (value is None, isinstance(value, str), value if value is not None else 0)
+
+        self.order = sorted(range(len(self.rows)), key=key, reverse=self.sort_descending)
+        self.top = 0
+        self.update_header_arrows()
+        self.render()
+
+    def update_header_arrows(self):
+        for idx, btn in enumerate(self.header_buttons):
+            arrow = ""
+            if idx == self.sort_column:
+                arrow = " ▼" if self.sort_descending else " ▲"
+            btn.configure(text=self.headers[idx] + arrow)
+
+    def max_top(self):
+        return max(0, len(self.rows) - len(self.row_widgets))
+
+    def scroll_rows(self, count):
+        self.scroll_to(self.top + count)
+
+    def scroll_to(self, top):
+        top = min(max(0, int(top)), self.max_top())
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(amount) * len(self.rows)))
+        elif action == "scroll":
+            step = len(self.row_widgets) if unit == "pages" else 1
+            self.scroll_rows(int(amount) * step)
+
+    def render(self):
+        """ Put the rows from top onwards into the pooled widgets """
+        self.top = min(self.top, self.max_top())
+        if not self.rows:
+            for frame, _ in self.row_widgets:
+                frame.grid_remove()
+            self.empty_label.grid(row=0, column=0, sticky="w", padx=10, pady=5)
+            self.scrollbar.set(0, 1)
+            return
+        self.empty_label.grid_remove()
+
+        for position, (frame, labels) in enumerate(self.row_widgets):
+            index = self.top + position
+            if index >= len(self.rows):
+                frame.grid_remove()
+                continue
+            row = self.rows[self.order[index]]
+            for label, value in zip(labels, row):
+                if label.cget("text") != value:
+                    label.configure(text=value)
+            frame.grid(row=position, column=0, sticky="ew")
+
+        total = len(self.rows)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + len(self.row_widgets)) / total))
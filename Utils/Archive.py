@@ -0,0 +1,221 @@
+import os
+import threading
+
+import numpy as np
+
+from Utils.SessionQueries import utc_date_bounds
+
+# columnar copies of the live tables, missing values become NaN, -1 or ""
+CALIBRATION_DTYPE = np.dtype([("id", "<i8"), ("method_type", "<U16"), ("created_at", "<U19")])
+TABLE_DTYPES = {
+    "measurements": np.dtype([
+        ("id", "<i8"), ("calibration_id", "<i8"), ("set_value", "<f8"), ("calculated_value", "<f8"),
+        ("ref_set_diff", "<f8"), ("std", "<f8"), ("unit", "<U8"), ("frequency", "<U16"), ("timestamp", "<i8"),
+        ("num_samples", "<i8"), ("stop_reason", "<U16"), ("sample_offset", "<i8"), ("sample_count", "<i8"),
+    ]),
+    "colinearity": np.dtype([
+        ("id", "<i8"), ("calibration_id", "<i8"), ("linear_ref", "<f8"), ("measurement", "<f8"),
+        ("linear_diff", "<f8"), ("linear_std", "<f8"), ("unit", "<U8"), ("timestamp", "<i8"),
+        ("num_samples", "<i8"), ("stop_reason", "<U16"), ("sample_offset", "<i8"), ("sample_count", "<i8"),
+    ]),
+}
+# columns of the rows SessionQueries decodes, in its order
+RESULT_COLUMNS = {
+    "measurements": ("set_value", "calculated_value", "ref_set_diff", "std", "unit", "frequency", "timestamp"),
+    "colinearity": ("linear_ref", "measurement", "linear_diff", "linear_std", "unit", None, "timestamp"),
+}
+SAMPLE_DTYPE = np.dtype("<f8")
+
+
+def to_structured(rows, dtype):
+    """ SQL rows to a structured array, None becomes the column's missing value """
+    missing = {"f": np.nan, "i": -1, "U": ""}
+    fills = [missing[dtype[name].kind] for name in dtype.names]
+    return np.array([tuple(fill if value is None else value for value, fill in zip(row, fills)) for row in rows],
+                    dtype=dtype)
+
+
+def from_value(value):
+    """ Archived value back to what SQLite would have returned """
+    if isinstance(value, np.floating):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return None if value == -1 else int(value)
+    if isinstance(value, np.str_):
+        return str(value) or None
+    return value
+
+
+class ArchiveSegment():
+    """ One archiving run's sessions from one month, a directory of .npy files opened memory-mapped """
+
+    def __init__(self, path):
+        self.path = path
+        self.calibrations = np.load(os.path.join(path, "calibrations.npy"))
+        self.arrays = {}
+
+    def array(self, name):
+        if name not in self.arrays:
+            self.arrays[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self.arrays[name]
+
+    def rows(self, table, calib_id):
+        records = self.array(table)
+        return records[records["calibration_id"] == calib_id]
+
+
+class SessionArchive():
+    """ Calibrations moved out of the live database, one directory per month holding immutable segments """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.segments = []
+        self.index = {}  # calibration id -> segment
+        if os.path.isdir(directory):
+            for month in sorted(os.listdir(directory)):
+                month_path = os.path.join(directory, month)
+                if not os.path.isdir(month_path):
+                    continue
+                for segment in sorted(os.listdir(month_path)):
+                    # unfinished segments are left as .tmp and ignored
+                    if not segment.endswith(".tmp"):
+                        self.add_segment(ArchiveSegment(os.path.join(month_path, segment)))
+
+    def add_segment(self, segment):
+        with self.lock:
+            self.segments.append(segment)
+            for calib_id in segment.calibrations["id"]:
+                self.index[int(calib_id)] = segment
+
+    def contains(self, calib_id):
+        return calib_id in self.index
+
+    def session_masks(self, after=None, mode=None, date_from=None, date_to=None):
+        """ (segment, mask of its calibrations passing the filters) for every segment """
+        with self.lock:
+            segments = list(self.segments)
+        lower, upper = utc_date_bounds(date_from, date_to)
+        for segment in segments:
+            calibrations = segment.calibrations
+            mask = np.ones(calibrations.size, dtype=bool)
+            if after is not None:
+                created_at, calib_id = after
+                mask &= (calibrations["created_at"] < created_at) | (
+                        (calibrations["created_at"] == created_at) & (calibrations["id"] < calib_id))
+            if mode:
+                mask &= calibrations["method_type"] == mode
+            if lower:
+                mask &= calibrations["created_at"] >= lower
+            if upper:
+                mask &= calibrations["created_at"] < upper
+            yield segment, mask
+
+    def fetch_sessions(self, after=None, mode=None, date_from=None, date_to=None, limit=25):
+        """ Same page semantics as SessionQueries.fetch_sessions, over the archived calibrations """
+        found = []
+        for segment, mask in self.session_masks(after, mode, date_from, date_to):
+            found.extend((int(row["id"]), str(row["method_type"]), str(row["created_at"]))
+                         for row in segment.calibrations[mask])
+        found.sort(key=lambda row: (row[2], row[0]), reverse=True)
+        return found[:limit]
+
+    def count_sessions(self, mode=None, date_from=None, date_to=None):
+        return sum(int(mask.sum()) for _, mask in self.session_masks(None, mode, date_from, date_to))
+
+    def calibration(self, calib_id):
+        """ (id, method type, created at) of an archived calibration """
+        segment = self.index[calib_id]
+        row = segment.calibrations[segment.calibrations["id"] == calib_id][0]
+        return int(row["id"]), str(row["method_type"]), str(row["created_at"])
+
+    def session_results(self, calib_id):
+        """ (method type, measurement rows, colinearity rows) shaped like the live queries return them """
+        segment = self.index[calib_id]
+        calibration = segment.calibrations[segment.calibrations["id"] == calib_id][0]
+        results = {}
+        for table, columns in RESULT_COLUMNS.items():
+            records = np.sort(segment.rows(table, calib_id), order=["timestamp", "id"])
+            results[table] = [tuple(None if column is None else from_value(record[column]) for column in columns)
+                              for record in records]
+        return str(calibration["method_type"]), results["measurements"], results["colinearity"]
+
+    def export_rows(self, calib_id, table):
+        """ Result rows with sample count, stop reason and readings, in the order Export reads them live """
+        segment = self.index[calib_id]
+        flat = segment.array(f"{table}_samples")
+        columns = RESULT_COLUMNS[table] + ("num_samples", "stop_reason")
+        for record in np.sort(segment.rows(table, calib_id), order=["timestamp", "id"]):
+            samples = None
+            if record["sample_count"] >= 0:
+                samples = flat[record["sample_offset"]:record["sample_offset"] + record["sample_count"]]
+            yield (*(None if column is None else from_value(record[column]) for column in columns), samples)
+
+    def samples(self, calib_id, table="measurements"):
+        """ {row id: readings}, the arrays are slices of the memory-mapped sample file """
+        segment = self.index[calib_id]
+        flat = segment.array(f"{table}_samples")
+        records = np.sort(segment.rows(table, calib_id), order=["timestamp", "id"])
+        return {int(record["id"]): flat[record["sample_offset"]:record["sample_offset"] + record["sample_count"]]
+                for record in records if record["sample_count"] >= 0}
+
+    def archive(self, conn, cutoff, limit=None):
+        """ Move calibrations created before cutoff (YYYY-MM-DD HH:MM:SS, UTC like created_at) into the archive,
+        at most limit of the oldest. Runs on the database writer thread, returns how many calibrations were moved. """
+        calibrations = conn.execute("""
+            SELECT id, method_type, created_at FROM calibrations WHERE created_at < ? ORDER BY created_at, id
+            LIMIT ?
+        """, (cutoff, -1 if limit is None else limit)).fetchall()
+        if not calibrations:
+            return 0
+
+        by_month = {}
+        for row in calibrations:
+            # a crash between writing a segment and deleting its rows leaves them in both tiers
+            if row[0] not in self.index:
+                by_month.setdefault(row[2][:7], []).append(row)
+
+        for month, rows in by_month.items():
+            ids = [row[0] for row in rows]
+            placeholders = ", ".join("?" * len(ids))
+            arrays = {"calibrations": to_structured(rows, CALIBRATION_DTYPE)}
+            for table, dtype in TABLE_DTYPES.items():
+                columns = [name for name in dtype.names if not name.startswith("sample_")]
+                records = conn.execute(f"""
+                    SELECT {", ".join(columns)}, samples FROM {table}
+                    WHERE calibration_id IN ({placeholders}) ORDER BY id
+                """, ids).fetchall()
+                offset = 0
+                values = []
+                blobs = []
+                for *record, blob in records:
+                    count = len(blob) // SAMPLE_DTYPE.itemsize if blob is not None else -1
+                    values.append((*record, offset, count))
+                    if blob is not None:
+                        blobs.append(blob)
+                        offset += count
+                arrays[table] = to_structured(values, dtype)
+                arrays[f"{table}_samples"] = np.frombuffer(b"".join(blobs), dtype=SAMPLE_DTYPE)
+            self.add_segment(self.write_segment(month, arrays))
+
+        archived = [row[0] for row in calibrations]
+        placeholders = ", ".join("?" * len(archived))
+        with conn:
+            for table in TABLE_DTYPES:
+                conn.execute(f"DELETE FROM {table} WHERE calibration_id IN ({placeholders})", archived)
+            conn.execute(f"DELETE FROM calibrations WHERE id IN ({placeholders})", archived)
+        return len(archived)
+
+    def write_segment(self, month, arrays):
+        month_path = os.path.join(self.directory, month)
+        os.makedirs(month_path, exist_ok=True)
+        existing = [name for name in os.listdir(month_path) if not name.endswith(".tmp")]
+        path = os.path.join(month_path, f"{len(existing) + 1:06d}")
+
+        # written under a temporary name and renamed, so readers never see half a segment
+        temporary = path + ".tmp"
+        os.makedirs(temporary, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(temporary, f"{name}.npy"), array)
+        os.replace(temporary, path)
+        return ArchiveSegment(path)
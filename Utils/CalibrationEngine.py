@@ -0,0 +1,98 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CalibrationEngine():
+    """ Runs calibration coroutines on a private asyncio loop thread, so Stop can cancel any bus wait """
+
+    STOP_LATENCY_LIMIT = 1.0  # seconds from pressing Stop until acquisition has halted
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher  # UIDispatcher, results go to the Tk thread through it
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="calibration-engine", daemon=True)
+        self.thread.start()
+
+        self.io_executors = {}  # one thread per instrument keeps its transactions in order
+        self.io_futures = set()  # VISA calls queued or running, they outlive a cancelled await
+        self.task = None
+        self.stop_requested_at = None
+        self.stop_latencies = []
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, function, *args):
+        """ Start a calibration on the engine thread, plain functions run on a worker thread. Returns a Future. """
+        if asyncio.iscoroutinefunction(function):
+            coroutine = function(*args)
+        else:
+            coroutine = asyncio.to_thread(function, *args)
+        self.stop_requested_at = None
+        return asyncio.run_coroutine_threadsafe(self._track(coroutine), self.loop)
+
+    async def _track(self, coroutine):
+        task = self.task = asyncio.current_task()
+        try:
+            return await coroutine
+        except asyncio.CancelledError:
+            pass
+        finally:
+            # a stopped run finishing late must not forget a calibration started after it
+            if self.task is task:
+                self.task = None
+
+    def is_busy(self):
+        return self.task is not None
+
+    def stop(self):
+        """ Cancel the running calibration, whatever bus wait it is in """
+        task = self.task
+        if task is None or self.stop_requested_at is not None:
+            return
+        self.stop_requested_at = time.perf_counter()
+        self.loop.call_soon_threadsafe(task.cancel)
+
+    async def acknowledge_stop(self, timeout=10.0):
+        """ Called by the calibration once it has been cancelled. Waits until no VISA call is left running, since a
+        cancelled await does not interrupt the call itself, and returns the stop latency in seconds. """
+        if self.stop_requested_at is None:
+            return None
+        await self.wait_io_idle(timeout)
+        latency = time.perf_counter() - self.stop_requested_at
+        self.stop_latencies.append(latency)
+        return latency
+
+    async def wait_io_idle(self, timeout):
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            self.io_futures = {future for future in self.io_futures if not future.done()}
+            if not self.io_futures:
+                return True
+            await asyncio.sleep(0.005)
+        return False
+
+    async def run_io(self, name, function, *args):
+        """ Run a blocking VISA call on the instrument's I/O thread, awaiting it can be cancelled """
+        executor = self.io_executors.get(name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"io-{name}")
+            self.io_executors[name] = executor
+        future = executor.submit(functools.partial(function, *args))
+        self.io_futures = {pending for pending in self.io_futures if not pending.done()}
+        self.io_futures.add(future)
+        return await asyncio.wrap_future(future, loop=self.loop)
+
+    def post(self, kind, *payload, key=None):
+        """ Hand something to the Tk thread """
+        self.dispatcher.post(kind, *payload, key=key)
+
+    def close(self):
+        self.stop()
+        for executor in self.io_executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.loop.call_soon_threadsafe(self.loop.stop)
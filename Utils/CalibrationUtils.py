@@ -1,7 +1,24 @@
+import asyncio
+import functools
+import logging
 import os
-import sqlite3
-from datetime import datetime
-import pyvisa
+from datetime import datetime, timedelta, timezone
+import time
+import numpy as np
+
+from Utils.Archive import SessionArchive
+from Utils.CalibrationEngine import CalibrationEngine
+from Utils.CommandBatcher import BatchedSession
+from Utils.DatabaseMigrations import migrate
+from Utils.DatabaseWriter import DatabaseWriter, open_reader
+from Utils.InstrumentSession import InstrumentSessionManager
+from Utils.InstrumentState import InstrumentShadow, f5522a_state, hp34401a_state
+from Utils.Pipeline import StageTimeline
+from Utils.PointPlanner import TestPoint, plan_order
+from Utils.ResultsWriter import ResultsWriter, insert_calibration, pack_samples
+from Utils.SessionCache import SessionCache
+from Utils.SessionQueries import load_session_rows
+from Utils.SettleUtils import SettleWaiter
 
 class CalibrationUtils():
 
@@ -9,20 +26,50 @@ class CalibrationUtils():
         # database stuff
         self.db_name = db_name
         self.conn = None
+        self.db_writer = None
         self.ensure_connection()
+        # sessions older than this move to memory-mapped monthly files next to the database. Off unless
+        # ARCHIVE_AFTER_DAYS is set, so nobody's calibrations are moved without asking for it.
+        archive_after_days = os.environ.get("ARCHIVE_AFTER_DAYS")
+        self.archive_after_days = int(archive_after_days) if archive_after_days else None
+        self.archive = SessionArchive(os.path.join(os.path.dirname(os.path.abspath(db_name)), "archive"))
+        # archived a few calibrations per writer job while no calibration runs, so saving never waits long
+        self.archive_chunk = 100
+        self.archived = 0
+        # pages given back to the file system per writer job once archiving is done
+        self.vacuum_pages = 256
+        self.schedule_archiving()
+        self.session_cache = SessionCache(lambda conn, calib_id: load_session_rows(conn, calib_id, self.archive),
+                                          lambda: open_reader(self.db_name))
+        # result rows are written in one transaction per calibration instead of one commit per row
+        self.results_writer = ResultsWriter(self.db_writer, on_written=self.session_cache.invalidate)
         self.hpadress = 22
         self.flukeadress = 4
         self.custom_address_chosen = False
         # actual calibration stuff
-        self.rm = pyvisa.ResourceManager()
+        self.instruments = InstrumentSessionManager(self.visa_backend)
+        self.shadows = {"HP34401A": InstrumentShadow(hp34401a_state), "F5522A": InstrumentShadow(f5522a_state)}
+        # measurements run on the engine's event loop, results come back to the Tk thread through the dispatcher
+        self.engine = CalibrationEngine(self.ui)
+        # longest single READ?, Stop waits for the one in flight
+        self.readSlice = self.engine.STOP_LATENCY_LIMIT / 2
+        self.readingTime = None  # seconds per reading at the current DMM configuration, None until measured
+        self.readingTimes = {}  # CONFigure command -> seconds per reading last measured with it
+        self.expectedReadingTime = 0.1  # sizes the first READ? of a configuration never measured before
+        self.dmmConfiguration = None
+        self.ui.register("point", self.log_everything, "latest")
+        self.ui.register("values", self.upper_panel.value_display.update_values, "latest")
+        self.ui.register("graph", lambda batches: self.graph.update_data([value for batch in batches for value in batch]),
+                         "concat")
+        self.ui.register("log", self.terminal.write_lines, "concat")
+        self.ui.start()
 
         self.index = 0
 
-        total_values = len(self.upper_panel.value_display.value_labels)
-
-        self.current_values = [{"Value": "--", "Label": "mV"} for _ in range(total_values)]
-        self.difference_values = [{"Value": "--", "Label": "mV"} for _ in range(total_values)]
-        self.std_values = [{"Value": "--", "Label": "mV"} for _ in range(total_values)]
+        # one entry per reference point, resized by changeMeasParam
+        self.current_values = []
+        self.difference_values = []
+        self.std_values = []
         self.measParameters = {
             "references": [0, 100, -100, 1, -1, 10, -10, 100, -100, 1000, -1000],
             "linearRefs": [0, 1, 2, 3, 4, 5, 6, 7, 8, 9],}
@@ -42,7 +89,21 @@ class CalibrationUtils():
             "diffLinearMeas": [None] * len(self.measParameters["linearRefs"]),
             "linearStdVars": [None] * len(self.measParameters["linearRefs"]),
             "measType": "",
-            "dirType": ""
+            "dirType": "",
+            "settleTimeout": 30.0,
+            "settleTimes": [],
+            "linearSettleTimes": [],
+            "adaptive": False,  # True samples each point until semTarget instead of numOfMeas readings
+            "minMeas": 3,
+            "maxMeas": 50,
+            "semTargetPpm": 10,  # of range, AC specs are an order of magnitude looser
+            "acSemTargetPpm": 100,
+            "numSamples": [],
+            "stopReasons": [],
+            "linearNumSamples": [],
+            "linearStopReasons": [],
+            "samples": [],  # raw readings of every point in SI units
+            "linearSamples": [],
         }
 
 
@@ -71,62 +132,169 @@ class CalibrationUtils():
 
         self.upper_panel.value_display.update_values(self.current_values, self.difference_values, self.std_values)
 
-    def waitForSettled(self):
-        SETTLED = 12
-        while not (int(self.F5522A.query('ISR?')) & (1 << SETTLED)):
-            pass
-
-    def measurement(self,numOfMeas: int, measRange: float):
-        # inicializacija lista z dimenzijo numOfMeas
-        MeasArray = [None] * numOfMeas
-
-        # ponovitev meritev tolikokrat kot je vrednost numOfMeas
-        for SameMeasNum in range(numOfMeas):
-            HP34401A_string = f"MEASure:{self.measType}{self.dirType}? {str(measRange)}"
-            self.terminal.log(f"IN HP34401A: {HP34401A_string}")
-            Meas = float(self.HP34401A.query(HP34401A_string))
-            self.terminal.log(f"OUT HP34401A: {str(Meas)}")
-            MeasArray[SameMeasNum] = Meas
-            if self.interrupt_calib("Measurement interrupted."): return
-
-        # izračun povprečne vrednosti meritev
-        MeasAverage = sum(MeasArray) / numOfMeas
-
-        # izračun standardne deviacije meritev
-        stdVar = (sum((Meas - MeasAverage) ** 2 for Meas in MeasArray) / (numOfMeas - 1)) ** (1 / 2)
-
-
-
-        return MeasAverage, stdVar
-
-    def calibrate(self):
+    async def waitForSettled(self):
+        """ Wait for the calibrator output to settle, returns the wait status and how long it took """
+        status = await self.engine.run_io("F5522A", self.settle_waiter.wait)
+        duration = self.settle_waiter.last_duration
+        if status == "timeout":
+            self.terminal.log(f"F5522A did not settle within {self.settle_waiter.timeout} s.", logging.WARNING)
+        elif status == "settled":
+            self.terminal.log(f"F5522A settled in {duration:.2f} s")
+        return status, duration
+
+    async def write_instrument(self, name, command):
+        """ Log and write a command, unless the shadowed instrument state says it would change nothing """
+        if not self.shadows[name].needs(command):
+            return False
+        if name == "HP34401A" and command.upper().startswith("CONF"):
+            # a new function or range can have a different reading time
+            self.dmmConfiguration = command
+            self.readingTime = self.readingTimes.get(command)
+        self.terminal.log(f"IN {name}: {command}", logging.DEBUG)
+        await self.engine.run_io(name, getattr(self, name).write, command)
+        return True
+
+    def sliceSize(self, count):
+        """ Readings per READ?, as many of count as fit in readSlice at the known or expected reading time """
+        readingTime = self.readingTime or self.expectedReadingTime
+        return max(1, min(count, int(self.readSlice / max(readingTime, 1e-3))))
+
+    async def readBurst(self, count):
+        """ Take count readings with as few READ? as possible, the range has to be configured beforehand. A single
+        READ? cannot be interrupted, so each one is kept short enough for Stop to take effect within its limit. """
+        readings = []
+        while len(readings) < count:
+            chunk = self.sliceSize(count - len(readings))
+
+            # CONFigure resets the sample count, configurePoint already set it for the first slice
+            for HP34401A_string in (f"SAMPle:COUNt {chunk}", "TRIGger:COUNt 1"):
+                await self.write_instrument("HP34401A", HP34401A_string)
+
+            # the timeout only has to cover this slice, slow integration times take a few hundred ms per reading
+            self.HP34401A.timeout = max(2000, int(3000 * chunk * (self.readingTime or 1)))
+
+            HP34401A_string = "READ?"
+            self.terminal.log(f"IN HP34401A: {HP34401A_string}", logging.DEBUG)
+            start = time.perf_counter()
+            reply = await self.engine.run_io("HP34401A", self.HP34401A.query, HP34401A_string)
+            self.readingTime = (time.perf_counter() - start) / chunk
+            self.readingTimes[self.dmmConfiguration] = self.readingTime
+            self.terminal.log(f"OUT HP34401A: {reply.strip()}", logging.DEBUG)
+            readings.extend(reply.strip().split(","))
+
+        return np.array(readings, dtype=np.float64)
+
+    def semTarget(self, measRange, reference, unit="V"):
+        """ Standard error of the mean a point has to reach in adaptive mode, None for a fixed sample count """
+        if not self.measParameters["adaptive"]:
+            return None
+        # points without a DMM range (frequency) scale by the reference, in SI units like the readings
+        scale = (measRange if isinstance(measRange, (int, float)) and measRange > 0
+                 else abs(reference) * self.convertMeasurments(unit))
+        ppm = self.measParameters["acSemTargetPpm" if self.dirType == ":AC" else "semTargetPpm"]
+        return ppm * 1e-6 * max(scale, 1e-12)
+
+    async def measurement(self, numOfMeas: int, semTarget=None):
+        """ Take numOfMeas readings in one burst, or with semTarget keep sampling until the standard error of the
+        mean falls below it. Returns the mean, std, number of readings, why sampling stopped and the readings. """
+        if semTarget is None:
+            MeasArray = await self.readBurst(numOfMeas)
+            stopReason = "fixed"
+        else:
+            minMeas = max(self.measParameters["minMeas"], 2)
+            maxMeas = max(self.measParameters["maxMeas"], minMeas)
+            MeasArray = await self.readBurst(minMeas)
+            while True:
+                if self.interrupt_calib("Measurement interrupted."): return
+                stdVar = MeasArray.std(ddof=1)
+                if stdVar / np.sqrt(MeasArray.size) <= semTarget:
+                    stopReason = "target"
+                    break
+                if MeasArray.size >= maxMeas:
+                    stopReason = "max"
+                    break
+                # ocena števila meritev, potrebnih za ciljno standardno napako
+                needed = int(np.ceil((stdVar / semTarget) ** 2))
+                count = min(max(needed - MeasArray.size, 1), maxMeas - MeasArray.size)
+                MeasArray = np.concatenate((MeasArray, await self.readBurst(count)))
+
+        if self.interrupt_calib("Measurement interrupted."): return
+
+        # izračun povprečne vrednosti in standardne deviacije meritev
+        MeasAverage = float(MeasArray.mean())
+        stdVar = float(MeasArray.std(ddof=1)) if MeasArray.size > 1 else 0.0
+        self.terminal.log(f"{MeasArray.size} readings, stopped on {stopReason}")
+
+        return MeasAverage, stdVar, MeasArray.size, stopReason, MeasArray
+
+    async def calibrate(self):
+        """ Connect and run the measurement, returns False when the instruments could not be connected. The stop and
+        the address popup are then already posted to the Tk thread. """
         try:
-            self.HP34401A = self.rm.open_resource(f'GPIB0::{self.hpadress}::INSTR')
-
-            # Try a simple query to test connection
-            idn_hp = self.HP34401A.query("*IDN?")
-            self.terminal.log("HP 34401A connected.")
-
-            self.F5522A = self.rm.open_resource(f'GPIB0::{self.flukeadress}::INSTR')
-            self.F5522A.timeout = 2500
-
-            # Try a simple query to test connection
-            idn_fluke = self.F5522A.query("*IDN?")
-
-            self.terminal.log("FLUKE 5522A connected.")
-            print("FLUKE 5522A connected:", idn_fluke.strip())
+            self.HP34401A, reconnected = await self.engine.run_io("HP34401A", self.instruments.connect, "HP34401A",
+                                                                  f'GPIB0::{self.hpadress}::INSTR')
+            self.terminal.log("HP 34401A connected." if reconnected else "HP 34401A session reused.")
+
+            F5522A, reconnected = await self.engine.run_io("F5522A", self.instruments.connect, "F5522A",
+                                                           f'GPIB0::{self.flukeadress}::INSTR', 2500)
+            # calibrator commands are coalesced into one message per bus transaction
+            self.F5522A = BatchedSession(F5522A)
+            self.terminal.log("FLUKE 5522A connected." if reconnected else "FLUKE 5522A session reused.")
+            if reconnected:
+                print("FLUKE 5522A connected:", self.instruments.idns["F5522A"])
             self.terminal.log("Connected successfully")
-
-        except:
-            self.terminal.log("Cannot connect devices.")
-            self.stop_action()
-            self.show_input_popup(message="Enter addresses for HP 34401A and FLUKE 5522A (current addresses are incorrect or devices aren't turned on):", show_default=self.custom_address_chosen)
-            return
+            # the front panel may have been used since the last run, so a reused session is no proof of state
+            for shadow in self.shadows.values():
+                shadow.invalidate()
+            # the integration time may have changed with it
+            self.readingTimes.clear()
+            self.readingTime = None
+
+        except Exception:
+            self.terminal.log("Cannot connect devices.", logging.ERROR)
+            self.engine.post("call", self.stop_action)
+            self.engine.post("call", functools.partial(self.show_input_popup, message="Enter addresses for HP 34401A and FLUKE 5522A (current addresses are incorrect or devices aren't turned on):", show_default=self.custom_address_chosen))
+            return False
 
         self.HP34401A.timeout = 5000
         self.F5522A.timeout = 5000
-        self.measProcess()
-        self.stop_action(clear_graph=False)
+        self.settle_waiter = await self.engine.run_io("F5522A", SettleWaiter, self.F5522A, lambda: self.running,
+                                                      self.measParameters["settleTimeout"])
+        if self.settle_waiter.use_srq:
+            self.terminal.log("FLUKE 5522A settling via service requests.")
+        skipped_before = sum(shadow.skipped for shadow in self.shadows.values())
+        try:
+            await self.measProcess()
+        except asyncio.CancelledError:
+            latency = await self.engine.acknowledge_stop()
+            if latency is not None:
+                self.terminal.log(f"Measurement stopped in {latency * 1000:.0f} ms.")
+                if latency > self.engine.STOP_LATENCY_LIMIT:
+                    self.terminal.log(f"Stop took {latency:.2f} s, over the {self.engine.STOP_LATENCY_LIMIT} s limit",
+                                      logging.WARNING)
+            raise
+        except Exception:
+            # a failed transaction leaves the real instrument state unknown
+            for shadow in self.shadows.values():
+                shadow.invalidate()
+            raise
+        finally:
+            # shielded so the calibrator is put in standby even when Stop cancelled the calibration
+            await asyncio.shield(self.engine.run_io("F5522A", self.releaseCalibrator))
+            commands, messages, seconds = self.F5522A.summary()
+            self.terminal.log(f"F5522A: {commands} commands in {messages} bus transactions, {seconds:.2f} s on the bus")
+            skipped = sum(shadow.skipped for shadow in self.shadows.values()) - skipped_before
+            self.terminal.log(f"Skipped {skipped} commands that would not have changed instrument state")
+            self.terminal.log(self.ui.summary())
+        return True
+
+    def releaseCalibrator(self):
+        """ Standby the output and disarm SRQ, runs on the calibrator's I/O thread """
+        if self.shadows["F5522A"].needs("STBY"):
+            self.terminal.log("IN F5522A: STBY", logging.DEBUG)
+            self.F5522A.write("STBY")
+        self.settle_waiter.disable_srq()
+        self.F5522A.flush()
 
     def changeMeasParam(self,typeOfMeas: str):
 
@@ -210,8 +378,15 @@ class CalibrationUtils():
 
             case _: # default
                 pass
+        for key in ("settleTimes", "numSamples", "stopReasons", "samples"):
+            self.measParameters[key] = [None] * len(self.measParameters["references"])
+        for key in ("linearSettleTimes", "linearNumSamples", "linearStopReasons", "linearSamples"):
+            self.measParameters[key] = [None] * len(self.measParameters["linearRefs"])
         print(self.measParameters["frequencies"])
         print(self.measParameters["references"])
+        self.current_values = [{"Value": "--", "Label": unit} for unit in self.measParameters["units"]]
+        self.difference_values = [{"Value": "--", "Label": unit} for unit in self.measParameters["units"]]
+        self.std_values = [{"Value": "--", "Label": unit} for unit in self.measParameters["units"]]
         for i in range(len(self.measParameters["measurements"])):
             self.log_everything(i)
 
@@ -221,228 +396,304 @@ class CalibrationUtils():
             self.terminal.log(message)
             return True
 
-    def measProcess(self):
+    async def measProcess(self):
         for i in range(16):
-            self.F5522A.query('ERR?')
+            # ob napakah stanje kalibratorja ni več znano
+            reply = await self.engine.run_io("F5522A", self.F5522A.query, 'ERR?')
+            if not reply.strip().startswith("0,"):
+                self.shadows["F5522A"].invalidate()
         self.measType = self.measParameters['measType']
         self.dirType = self.measParameters['dirType']
-        self.freqNum = 0
+        self.frequency = self.measParameters["unique_frequencies"][0]
+        for key in ("settleTimes", "numSamples", "stopReasons", "samples"):
+            self.measParameters[key] = [None] * len(self.measParameters["references"])
+        for key in ("linearSettleTimes", "linearNumSamples", "linearStopReasons", "linearSamples"):
+            self.measParameters[key] = [None] * len(self.measParameters["linearRefs"])
+        self.timeline = StageTimeline()
+
+        # multimeter setup runs as a task while the calibrator settles, display updates go to the Tk thread
+        try:
+            await self.measPipeline()
+        finally:
+            self.terminal.log(self.timeline.summary())
+
+    def planMeasOrder(self):
+        """ Execution order of the reference points, results still land in their display slots """
+        points = []
+        for MeasNum, reference in enumerate(self.measParameters["references"]):
+            value = reference * self.convertMeasurments(self.measParameters["units"][MeasNum])
+            frequency = self.measParameters["frequencies"][MeasNum] if self.dirType == ":AC" else None
+            # štirižične meritve upornosti (prve tri točke) morajo biti pred dvožičnimi
+            phase = 1 if self.measType in ('FRESistance', 'RESistance') and MeasNum >= 3 else 0
+            points.append(TestPoint(value, self.measParameters["range"][MeasNum], frequency, phase))
+        return plan_order(points)
+
+    async def measPipeline(self):
+        self.measParameters["order"] = self.planMeasOrder()
+        self.terminal.log("Point order: " + ", ".join(str(MeasNum) for MeasNum in self.measParameters["order"]))
 
-        self.frequency = self.measParameters["unique_frequencies"][self.freqNum]
         # prvi del kalibracije
+        order = self.measParameters["order"]
+        configured = self.configurePoint(order[0]) if order else None
+        for position, MeasNum in enumerate(order):
+            with self.timeline.stage(MeasNum, "source"):
+                # postavitev frekvence na nič pri meritvah DC veličin
+                if self.dirType != ":AC" and self.measType != 'FREQuency' and position == 0:
+                    F5522A_string = "OUT 0 Hz"
+                    await self.write_instrument("F5522A", F5522A_string)
+
+                # postavitev frekvence pri meritvah AC veličin
+                if self.dirType == ":AC":
+                    self.frequency = self.measParameters["frequencies"][MeasNum]
+                    F5522A_string = f"OUT {self.frequency}"
+                    await self.write_instrument("F5522A", F5522A_string)
 
-        for MeasNum in range(len(self.measParameters["references"])):
-            # postavitev frekvence na nič pri meritvah DC veličin
-            if self.dirType != ":AC" and self.measType != 'FREQuency' and MeasNum == 0:
-                F5522A_string = "OUT 0 Hz"
-                self.terminal.log(f'IN F5522A: {F5522A_string}')
-                self.F5522A.write(F5522A_string)
-
-            # postavitev referenčne napetosti na 1 V pri meritvah frekvence
-            if self.dirType == ":AC":
-                self.frequency = self.measParameters["unique_frequencies"][self.freqNum]
-                F5522A_string = f"OUT {self.frequency}"
-                self.terminal.log(f'IN F5522A: {F5522A_string}')
-                self.F5522A.write(F5522A_string)
-                self.freqNum = (self.freqNum + 1) % len(self.measParameters["unique_frequencies"])
-
-            # postavitev na dvožični način merjenja upornosti
-            if self.measType == 'FRESistance' and MeasNum == 3:
-                self.measParameters["measType"] = 'RESistance'
-                self.measType = self.measParameters['measType']
-
-            # postavitev referenčne napetosti na 1 V pri meritvah frekvence
-            if self.measType == 'FREQuency' and MeasNum == 0:
-                F5522A_string = "OUT 1 V"
-                self.terminal.log(f'IN F5522A: {F5522A_string}')
-                self.F5522A.write(F5522A_string)
-
-            # konfiguracija meritve na multimetru HP34401A
-            HP34401A_string = f"{'CONFigure:'}{self.measType}{self.dirType} {self.measParameters['range'][MeasNum]}"
-            self.terminal.log(f'IN HP34401A: {HP34401A_string}')
-            self.HP34401A.write(HP34401A_string)
-
-            # konfiguracija referenčne vrednosti na kalibratorju F5522A
-            F5522A_string = f"{'OUT'} {self.measParameters['references'][MeasNum]} {self.measParameters['units'][MeasNum]}"
-            self.terminal.log(f'IN F5522A: {F5522A_string}')
+                # postavitev referenčne napetosti na 1 V pri meritvah frekvence
+                if self.measType == 'FREQuency' and position == 0:
+                    F5522A_string = "OUT 1 V"
+                    await self.write_instrument("F5522A", F5522A_string)
 
-            self.F5522A.write(F5522A_string)
+                # konfiguracija referenčne vrednosti na kalibratorju F5522A
+                F5522A_string = f"{'OUT'} {self.measParameters['references'][MeasNum]} {self.measParameters['units'][MeasNum]}"
+                await self.write_instrument("F5522A", F5522A_string)
 
-            # vklop referenčne vrednosti na kalibratorju F5522A
-            F5522A_string = 'OPER'
-            self.terminal.log(f'IN F5522A: {F5522A_string}')
-            self.F5522A.write(F5522A_string)
+                # vklop referenčne vrednosti na kalibratorju F5522A
+                F5522A_string = 'OPER'
+                await self.write_instrument("F5522A", F5522A_string)
+                await self.engine.run_io("F5522A", self.F5522A.flush)
 
             if self.interrupt_calib("Measurement interrupted."): return
             # čakanje na izravnavo referenčne vrednosti
-            self.waitForSettled()
+            with self.timeline.stage(MeasNum, "settle"):
+                _, self.measParameters["settleTimes"][MeasNum] = await self.waitForSettled()
+            await configured
             if self.interrupt_calib("Measurement interrupted."): return
 
-            # izračun in zapis meritve
-            [MeasAverage, stdVar] = self.measurement(self.measParameters["numOfMeas"], self.measParameters["range"][MeasNum])
-            unitConv = self.convertMeasurments(self.measParameters["units"][MeasNum])
-            self.measParameters["measurements"][MeasNum] = MeasAverage / unitConv
-            self.measParameters["diffMeas"][MeasNum] = self.measParameters["references"][MeasNum] - MeasAverage / unitConv
-            self.measParameters["stdVars"][MeasNum] = stdVar / unitConv
-
-            print(self.measParameters["stdVars"][MeasNum])
-
-            self.log_everything(MeasNum)
+            # meritev
+            with self.timeline.stage(MeasNum, "acquire"):
+                result = await self.measurement(self.measParameters["numOfMeas"],
+                                                self.semTarget(self.measParameters["range"][MeasNum],
+                                                               self.measParameters["references"][MeasNum],
+                                                               self.measParameters["units"][MeasNum]))
+            if result is None: return
 
             # izklop referenčne vrednosti na kalibratorju F5522A
             F5522A_string = 'STBY'
-            self.terminal.log(f'IN F5522A: {F5522A_string}')
-            self.F5522A.write(F5522A_string)
+            await self.write_instrument("F5522A", F5522A_string)
+            # STBY mora biti poslan pred naslednjo konfiguracijo, sicer multimeter preklopi območje pod napetostjo
+            await self.engine.run_io("F5522A", self.F5522A.flush)
 
-            self.terminal.log("")
+            # konfiguracija multimetra za naslednjo točko, medtem ko se ta obdeluje in se kalibrator izravnava
+            if position + 1 < len(order):
+                configured = self.configurePoint(order[position + 1])
+
+            # izračun in zapis meritve
+            with self.timeline.stage(MeasNum, "process"):
+                self.processPoint(MeasNum, *result)
 
         if self.measType == "VOLTage":
             # konfiguracija meritve na multimetru HP34401A
             HP34401A_string = f"CONFigure:{self.measType}{self.dirType} 10"
-            self.terminal.log(f'IN HP34401A: {HP34401A_string}')
-            self.HP34401A.write(HP34401A_string)
+            configured = asyncio.create_task(self.timeline.run("linear", "configure",
+                                                               self.configureDMM(HP34401A_string)))
 
             for MeasNum in range(len(self.measParameters["linearRefs"])):
+                point = f"linear {MeasNum}"
+                with self.timeline.stage(point, "source"):
+                    if self.dirType == ":AC":
+                        F5522A_string = "OUT 10 V"
+                        await self.write_instrument("F5522A", F5522A_string)
 
-                if self.dirType == ":AC":
-                    F5522A_string = "OUT 10 V"
-                    self.terminal.log(f'IN F5522A: {F5522A_string}')
-                    self.F5522A.write(F5522A_string)
+                    # konfiguracija referenčne vrednosti na kalibratorju F5522A
+                    F5522A_string = f"{'OUT'} {str(self.measParameters['linearRefs'][MeasNum])} {self.measParameters['linearUnits'][MeasNum]}"
+                    await self.write_instrument("F5522A", F5522A_string)
 
-                # konfiguracija referenčne vrednosti na kalibratorju F5522A
-                F5522A_string = f"{'OUT'} {str(self.measParameters['linearRefs'][MeasNum])} {self.measParameters['linearUnits'][MeasNum]}"
-                print({self.measParameters['linearUnits'][MeasNum]})
-                self.terminal.log(f'IN F5522A: {F5522A_string}')
-                self.F5522A.write(F5522A_string)
-
-                # vklop referenčne vrednosti na kalibratorju F5522A
-                F5522A_string = 'OPER'
-                self.terminal.log(f'IN F5522A: {F5522A_string}')
-                self.F5522A.write(F5522A_string)
+                    # vklop referenčne vrednosti na kalibratorju F5522A
+                    F5522A_string = 'OPER'
+                    await self.write_instrument("F5522A", F5522A_string)
+                    await self.engine.run_io("F5522A", self.F5522A.flush)
 
                 # čakanje na izravnavo referenčne vrednosti
-                self.waitForSettled()
+                with self.timeline.stage(point, "settle"):
+                    _, self.measParameters["linearSettleTimes"][MeasNum] = await self.waitForSettled()
+                await configured
+                if self.interrupt_calib("Measurement interrupted."): return
 
-                # izračun in zapis meritve
-                HP34401A_string = f"MEASure:{self.measType}{self.dirType}? 10"
-                [MeasAverage, stdVar] = self.measurement(self.measParameters["numOfMeas"], measRange = 10)
-                self.measParameters["linearMeas"][MeasNum] = MeasAverage
-                self.measParameters["diffLinearMeas"][MeasNum] = self.measParameters["linearRefs"][MeasNum] - MeasAverage
-                self.measParameters["linearStdVars"][MeasNum] = stdVar
+                # meritev
+                with self.timeline.stage(point, "acquire"):
+                    result = await self.measurement(self.measParameters["numOfMeas"], self.semTarget(10, 10))
+                if result is None: return
 
                 # izklop referenčne vrednosti na kalibratorju F5522A
                 F5522A_string = 'STBY'
-                self.terminal.log(f'IN F5522A: {F5522A_string}')
-                self.F5522A.write(F5522A_string)
-
-                self.terminal.log("")
-                lref = self.measParameters["linearRefs"][MeasNum]
-                lmeas = self.measParameters["linearMeas"][MeasNum]
-                unit = self.measParameters["linearUnits"][MeasNum]
-                self.graph.update_data([{"Value": lmeas, "Label": unit, "Step": lref}])
-
-
-
-
+                await self.write_instrument("F5522A", F5522A_string)
 
+                # izračun in zapis meritve
+                with self.timeline.stage(point, "process"):
+                    self.processLinearPoint(MeasNum, *result)
+
+    def configurePoint(self, MeasNum):
+        """ Start the HP 34401A CONFigure for a point on its I/O thread, the pipeline awaits it before acquiring """
+        # postavitev na dvožični način merjenja upornosti
+        if self.measType == 'FRESistance' and MeasNum >= 3:
+            self.measType = 'RESistance'
+
+        # konfiguracija meritve na multimetru HP34401A
+        HP34401A_string = f"{'CONFigure:'}{self.measType}{self.dirType} {self.measParameters['range'][MeasNum]}"
+        return asyncio.create_task(self.timeline.run(MeasNum, "configure", self.configureDMM(HP34401A_string)))
+
+    async def configureDMM(self, HP34401A_string):
+        """ CONFigure the HP 34401A and set the sample count of the first READ?, so it returns a full slice """
+        await self.write_instrument("HP34401A", HP34401A_string)
+        firstBurst = (max(self.measParameters["minMeas"], 2) if self.measParameters["adaptive"]
+                      else self.measParameters["numOfMeas"])
+        await self.write_instrument("HP34401A", f"SAMPle:COUNt {self.sliceSize(firstBurst)}")
+
+    def processPoint(self, MeasNum, MeasAverage, stdVar, numSamples, stopReason, MeasArray):
+        """ Store one reference point and hand it to the Tk thread for display """
+        unitConv = self.convertMeasurments(self.measParameters["units"][MeasNum])
+        self.measParameters["measurements"][MeasNum] = MeasAverage / unitConv
+        self.measParameters["diffMeas"][MeasNum] = self.measParameters["references"][MeasNum] - MeasAverage / unitConv
+        self.measParameters["stdVars"][MeasNum] = stdVar / unitConv
+        self.measParameters["numSamples"][MeasNum] = numSamples
+        self.measParameters["stopReasons"][MeasNum] = stopReason
+        self.measParameters["samples"][MeasNum] = MeasArray
+
+        print(self.measParameters["stdVars"][MeasNum])
+
+        # error in ppm of range, one curve per frequency for AC so flatness problems stand out
+        measRange = self.measParameters["range"][MeasNum]
+        reference = self.measParameters["references"][MeasNum] * unitConv
+        scale = measRange if isinstance(measRange, (int, float)) and measRange else abs(reference) or 1
+        curve = self.measParameters["frequencies"][MeasNum] if self.dirType == ":AC" else "Error"
+        self.engine.post("graph", [{"View": "points", "Curve": curve, "Step": reference,
+                                    "Value": self.measParameters["diffMeas"][MeasNum] * unitConv / scale * 1e6,
+                                    "Label": "ppm"}])
+
+        self.engine.post("point", MeasNum, key=MeasNum)
+        self.terminal.log("")
+
+    def processLinearPoint(self, MeasNum, MeasAverage, stdVar, numSamples, stopReason, MeasArray):
+        """ Store one linearity point and hand it to the Tk thread for the graph """
+        self.measParameters["linearMeas"][MeasNum] = MeasAverage
+        self.measParameters["diffLinearMeas"][MeasNum] = self.measParameters["linearRefs"][MeasNum] - MeasAverage
+        self.measParameters["linearStdVars"][MeasNum] = stdVar
+        self.measParameters["linearNumSamples"][MeasNum] = numSamples
+        self.measParameters["linearStopReasons"][MeasNum] = stopReason
+        self.measParameters["linearSamples"][MeasNum] = MeasArray
+
+        self.terminal.log("")
+        lref = self.measParameters["linearRefs"][MeasNum]
+        lmeas = self.measParameters["linearMeas"][MeasNum]
+        unit = self.measParameters["linearUnits"][MeasNum]
+        # AC flatness is measured at a constant 10 V, the reference list holds frequencies
+        reference = 10 if self.dirType == ":AC" else lref
+        self.engine.post("graph", [
+            {"View": "linear", "Curve": "Measured", "Step": lref, "Value": lmeas, "Std": stdVar, "Label": unit},
+            {"View": "linear error", "Curve": "Difference", "Step": lref, "Value": reference - lmeas, "Label": unit},
+        ])
 
     def ensure_connection(self):
-        """ Make sure the database exists and open a connection """
-        db_exists = os.path.exists(self.db_name)
-
-        # Allow the connection to be shared across threads
-        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-
-        if not db_exists:
-            self.create_tables()
-
-    def create_tables(self):
-        """ Create tables if they don't exist (only once) """
-        cursor = self.conn.cursor()
-
-        # Table for calibration events
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS calibrations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            method_type VARCHAR(255),
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-        """)
-
-        # Table for individual measurements
-        cursor.execute("""
-        CREATE TABLE IF NOT EXISTS measurements (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            calibration_id INTEGER,
-            set_value FLOAT,
-            calculated_value FLOAT,
-            ref_set_diff FLOAT,
-            std FLOAT,
-            unit STRING,
-            frequency STRING,
-            timestamp DATETIME,
-            FOREIGN KEY (calibration_id) REFERENCES calibrations(id)
-        )
-        """)
-
-        cursor.execute("""
-                CREATE TABLE IF NOT EXISTS colinearity (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    calibration_id INTEGER,
-                    linear_ref FLOAT,
-                    measurement FLOAT,
-                    linear_diff FLOAT,
-                    linear_std FLOAT,
-                    unit STRING,
-                    timestamp DATETIME,
-                    FOREIGN KEY (calibration_id) REFERENCES calibrations(id)
-                )
-                """)
-
-        self.conn.commit()
-        print(f"Database '{self.db_name}' created with 'calibrations' and 'measurements' tables.")
+        """ Start the writer thread, bring the schema up to date and open a read-only connection for the UI """
+        # all writes go through the writer thread, the Tk thread only ever reads
+        self.db_writer = DatabaseWriter(self.db_name, setup=self.migrate_database)
+        self.conn = open_reader(self.db_name)
+
+    def migrate_database(self, conn):
+        old_version, new_version = migrate(conn)
+        if old_version != new_version:
+            print(f"Database '{self.db_name}' migrated from schema {old_version} to {new_version}.")
+
+    def schedule_archiving(self, delay_ms=5000):
+        self.after(delay_ms, self.archive_when_idle)
+
+    def archive_when_idle(self):
+        """ Hand the next chunk of old calibrations to the writer thread, Tk thread only """
+        if self.archive_after_days is None:
+            return
+        if self.running:
+            self.schedule_archiving()
+            return
+        self.db_writer.submit(self.archive_old_sessions).add_done_callback(
+            lambda future: self.ui.call(self.archive_chunk_done, future))
+
+    def archive_chunk_done(self, future):
+        if future.exception() is not None:
+            self.terminal.log(f"Archiving failed: {future.exception()}", logging.ERROR)
+            return
+        self.archived += future.result()
+        if future.result() == self.archive_chunk:
+            # probably more left, carry on shortly so a calibration start gets the writer in between
+            self.schedule_archiving(200)
+        elif self.archived:
+            self.terminal.log(f"Archived {self.archived} calibrations older than {self.archive_after_days} days.")
+            self.after(200, self.reclaim_when_idle)
+
+    def archive_old_sessions(self, conn):
+        """ Move the next chunk of old calibrations to the archive, runs on the database writer thread """
+        # created_at is UTC, as written by CURRENT_TIMESTAMP
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=self.archive_after_days)).strftime("%Y-%m-%d %H:%M:%S")
+        return self.archive.archive(conn, cutoff, self.archive_chunk)
+
+    def reclaim_when_idle(self):
+        """ Hand the next few freed pages to the writer thread to give back to the file system, Tk thread only """
+        if self.running:
+            self.after(5000, self.reclaim_when_idle)
+            return
+        self.db_writer.submit(self.reclaim_space).add_done_callback(
+            lambda future: self.ui.call(self.reclaim_done, future))
+
+    def reclaim_done(self, future):
+        if future.exception() is not None:
+            self.terminal.log(f"Compacting the database failed: {future.exception()}", logging.ERROR)
+        elif future.result():
+            self.after(200, self.reclaim_when_idle)
+        else:
+            self.terminal.log(f"Database '{self.db_name}' compacted.")
+
+    def reclaim_space(self, conn):
+        """ Shrink the file by up to vacuum_pages free pages, runs on the database writer thread. Returns True while
+        free pages are left. """
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # a database from before incremental auto vacuum switches over with one full VACUUM
+            conn.execute("VACUUM")
+            return False
+        # execute() would step the pragma once, which frees a single page, executescript runs it to the end
+        conn.executescript(f"PRAGMA incremental_vacuum({self.vacuum_pages})")
+        return conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
 
     def log_new_calibration(self, method_type):
-        cursor = self.conn.cursor()
-
-        cursor.execute(
-            "INSERT INTO calibrations (method_type) VALUES (?)",
-            (method_type,)
-        )
-        calibration_id = cursor.lastrowid
-        self.conn.commit()
+        self.flush_results()
+        calibration_id = self.db_writer.call(insert_calibration, method_type)
         print(f"New calibration with method '{method_type}' logged with ID {calibration_id}.")
 
         return calibration_id
 
+    def flush_results(self):
+        """ Write all queued result rows, called when a calibration ends, is stopped or fails """
+        rows, seconds = self.results_writer.flush()
+        if rows:
+            self.terminal.log(f"Saved {rows} results in {seconds * 1000:.0f} ms")
+        return rows, seconds
+
     def close(self):
         if self.conn:
+            self.flush_results()
+            self.db_writer.close()
             self.conn.close()
 
-    def log_measurement(self, calibration_id, set_value, calculated_value, ref_set_diff, std, frequency, unit):
-        cursor = self.conn.cursor()
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        cursor.execute("""
-            INSERT INTO measurements (calibration_id, set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (calibration_id, set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp))
+    def log_measurement(self, calibration_id, set_value, calculated_value, ref_set_diff, std, frequency, unit,
+                        num_samples=None, stop_reason=None, samples=None):
+        """ Queue a measurement row, it is written on the next flush_results """
+        self.results_writer.add("measurements", (calibration_id, set_value, calculated_value, ref_set_diff, std, unit,
+                                                 frequency, int(time.time()), num_samples, stop_reason,
+                                                 pack_samples(samples)))
 
-        self.conn.commit()
-        print(f"Measurement logged for calibration ID {calibration_id}.")
-
-    def log_linear_refs(self, calibration_id, set_value, calculated_value, ref_set_diff, std, unit):
-        cursor = self.conn.cursor()
-
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        cursor.execute("""
-            INSERT INTO colinearity (calibration_id, linear_ref, measurement, linear_diff, linear_std, unit, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (calibration_id, set_value, calculated_value, ref_set_diff, std, unit, timestamp))
-
-        self.conn.commit()
-        print(f"Measurement logged for calibration ID {calibration_id}.")
+    def log_linear_refs(self, calibration_id, set_value, calculated_value, ref_set_diff, std, unit,
+                        num_samples=None, stop_reason=None, samples=None):
+        """ Queue a linearity row, it is written on the next flush_results """
+        self.results_writer.add("colinearity", (calibration_id, set_value, calculated_value, ref_set_diff, std, unit,
+                                                int(time.time()), num_samples, stop_reason, pack_samples(samples)))
 
     def convertMeasurments(self, unit):
         unitConv = 1
@@ -453,5 +704,3 @@ class CalibrationUtils():
         if unit[0] == "M":
             unitConv = 1e6
         return unitConv
-
-
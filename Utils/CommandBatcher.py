@@ -0,0 +1,62 @@
+import time
+
+
+class BatchedSession():
+    """ Wraps a VISA session, queues writes and sends them as one semicolon-joined message before anything is read """
+
+    def __init__(self, session, separator=";", max_length=200):
+        self.session = session
+        self.separator = separator
+        self.max_length = max_length  # stay well inside the instrument's input buffer
+        self.pending = []
+        self.trace = []  # (message, number of commands, seconds on the bus)
+
+    @property
+    def timeout(self):
+        return self.session.timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self.session.timeout = value
+
+    def write(self, command):
+        message_length = sum(len(c) + len(self.separator) for c in self.pending) + len(command)
+        if self.pending and message_length > self.max_length:
+            self.flush()
+        self.pending.append(command)
+
+    def flush(self):
+        if not self.pending:
+            return
+        message = self.separator.join(self.pending)
+        count = len(self.pending)
+        self.pending = []
+
+        start = time.perf_counter()
+        self.session.write(message)
+        self.trace.append((message, count, time.perf_counter() - start))
+
+    def query(self, command):
+        self.flush()
+        start = time.perf_counter()
+        reply = self.session.query(command)
+        self.trace.append((command, 1, time.perf_counter() - start))
+        return reply
+
+    def read_stb(self):
+        self.flush()
+        return self.session.read_stb()
+
+    def wait_on_event(self, *args, **kwargs):
+        self.flush()
+        return self.session.wait_on_event(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # events and the rest of the Resource API go straight to the session
+        return getattr(self.session, name)
+
+    def summary(self):
+        """ Returns (commands, messages, seconds on the bus) for everything sent so far """
+        commands = sum(count for _, count, _ in self.trace)
+        seconds = sum(elapsed for _, _, elapsed in self.trace)
+        return commands, len(self.trace), seconds
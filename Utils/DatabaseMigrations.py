@@ -0,0 +1,122 @@
+from Utils.DriftSummary import create_drift_table, rebuild_drift
+
+# Schema migrations, PRAGMA user_version holds the number of the last one applied
+
+
+def create_base_tables(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS calibrations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        method_type VARCHAR(255),
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS measurements (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        calibration_id INTEGER,
+        set_value FLOAT,
+        calculated_value FLOAT,
+        ref_set_diff FLOAT,
+        std FLOAT,
+        unit STRING,
+        frequency STRING,
+        timestamp DATETIME,
+        FOREIGN KEY (calibration_id) REFERENCES calibrations(id)
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS colinearity (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        calibration_id INTEGER,
+        linear_ref FLOAT,
+        measurement FLOAT,
+        linear_diff FLOAT,
+        linear_std FLOAT,
+        unit STRING,
+        timestamp DATETIME,
+        FOREIGN KEY (calibration_id) REFERENCES calibrations(id)
+    )
+    """)
+
+
+def add_sampling_columns(conn):
+    # databases created before versioning may already have them
+    for table in ("measurements", "colinearity"):
+        columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, column_type in (("num_samples", "INTEGER"), ("stop_reason", "STRING")):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def add_overview_indexes(conn):
+    # covering indexes, DatabaseOverview reads a session or the session list without touching the tables.
+    # Points of one run often share a timestamp, id right after it keeps them in the order they were measured.
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS measurements_by_calibration ON measurements
+        (calibration_id, timestamp, id, set_value, calculated_value, ref_set_diff, std, unit, frequency)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS colinearity_by_calibration ON colinearity
+        (calibration_id, timestamp, id, linear_ref, measurement, linear_diff, linear_std, unit)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS calibrations_by_created ON calibrations (created_at, id, method_type)")
+
+
+def add_raw_samples(conn):
+    # every reading of a point as a little-endian float64 blob, in SI units
+    for table in ("measurements", "colinearity"):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN samples BLOB")
+        # timestamps become integer unix time, the old strings were local time
+        conn.execute(f"""
+        UPDATE {table} SET timestamp = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)
+        WHERE typeof(timestamp) = 'text'
+        """)
+
+
+def add_drift_summary(conn):
+    create_drift_table(conn)
+    rebuild_drift(conn)
+
+
+def enable_incremental_vacuum(conn):
+    # archiving frees pages, PRAGMA incremental_vacuum then shrinks the file a little at a time. An existing file
+    # only switches modes at its next VACUUM, CalibrationUtils.reclaim_space runs that once when idle.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+
+MIGRATIONS = [
+    create_base_tables,
+    add_sampling_columns,
+    add_overview_indexes,
+    add_raw_samples,
+    add_drift_summary,
+    enable_incremental_vacuum,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """ Apply every migration newer than the database, each in its own transaction. Returns (old, new) version. """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than this program ({SCHEMA_VERSION})")
+
+    start = version
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+        except Exception:
+            conn.rollback()
+            raise
+        conn.commit()
+        version = number
+
+    if version != start:
+        conn.execute("ANALYZE")
+    return start, version
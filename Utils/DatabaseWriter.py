@@ -0,0 +1,78 @@
+import os
+import queue
+import sqlite3
+import threading
+import urllib.parse
+from concurrent.futures import Future
+
+# WAL lets the overview read while a calibration writes, NORMAL only syncs at checkpoints which WAL keeps safe
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",  # KiB
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class DatabaseWriter():
+    """ Owns the only writable connection, every write runs on its thread in the order it was submitted """
+
+    def __init__(self, db_name, setup=None):
+        self.db_name = db_name
+        self.requests = queue.Queue()
+        self.ready = Future()
+        self.thread = threading.Thread(target=self._run, args=(setup,), name="database-writer", daemon=True)
+        self.thread.start()
+        # surface errors opening or preparing the database in the caller
+        self.ready.result()
+
+    def _run(self, setup):
+        try:
+            conn = sqlite3.connect(self.db_name)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            if setup is not None:
+                setup(conn)
+        except Exception as e:
+            self.ready.set_exception(e)
+            return
+        self.ready.set_result(None)
+
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            future, function, args = request
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(conn, *args))
+            except Exception as e:
+                conn.rollback()
+                future.set_exception(e)
+        conn.close()
+
+    def submit(self, function, *args):
+        """ Queue function(conn, *args) on the writer thread, returns a Future with its result """
+        future = Future()
+        self.requests.put((future, function, args))
+        return future
+
+    def call(self, function, *args):
+        """ Like submit, but waits for the result """
+        return self.submit(function, *args).result()
+
+    def close(self):
+        """ Finish everything already queued, then close the connection """
+        if self.thread.is_alive():
+            self.requests.put(None)
+            self.thread.join()
+
+
+def open_reader(db_name):
+    """ Read-only connection for browsing, it never takes the write lock """
+    path = urllib.parse.quote(os.path.abspath(db_name).replace("\\", "/"), safe="/:")
+    # read-only, so sharing it with the fallback generator thread cannot corrupt anything
+    conn = sqlite3.connect(f"file:///{path.lstrip('/')}?mode=ro", uri=True, check_same_thread=False)
+    conn.execute("PRAGMA cache_size=-16000")
+    return conn
@@ -0,0 +1,99 @@
+import math
+
+# running statistics of ref_set_diff per reference point, updated with Welford's algorithm as results are written
+COLUMNS = ("count", "mean_diff", "m2_diff", "min_diff", "max_diff", "last_diff", "last_value", "last_timestamp")
+
+
+def create_drift_table(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS drift_summary (
+        method_type VARCHAR(255),
+        set_value FLOAT,
+        unit STRING,
+        frequency STRING,
+        count INTEGER,
+        mean_diff FLOAT,
+        m2_diff FLOAT,
+        min_diff FLOAT,
+        max_diff FLOAT,
+        last_diff FLOAT,
+        last_value FLOAT,
+        last_timestamp INTEGER,
+        PRIMARY KEY (method_type, set_value, unit, frequency)
+    )
+    """)
+
+
+def accumulate(stats, diff, value, timestamp):
+    """ Welford update of one summary row (a dict of COLUMNS) with a new point """
+    stats["count"] += 1
+    delta = diff - stats["mean_diff"]
+    stats["mean_diff"] += delta / stats["count"]
+    stats["m2_diff"] += delta * (diff - stats["mean_diff"])
+    stats["min_diff"] = diff if stats["min_diff"] is None else min(stats["min_diff"], diff)
+    stats["max_diff"] = diff if stats["max_diff"] is None else max(stats["max_diff"], diff)
+    if stats["last_timestamp"] is None or (timestamp or 0) >= stats["last_timestamp"]:
+        stats["last_diff"] = diff
+        stats["last_value"] = value
+        stats["last_timestamp"] = timestamp
+
+
+def update_drift(conn, rows):
+    """ Fold new measurements rows (in the ResultsWriter column order) into drift_summary. Runs inside the
+    transaction that inserts them, so the summary never disagrees with the table. """
+    rows = [row for row in rows if row[3] is not None]
+    if not rows:
+        return
+    calib_ids = sorted({row[0] for row in rows})
+    placeholders = ", ".join("?" * len(calib_ids))
+    method_types = dict(conn.execute(f"SELECT id, method_type FROM calibrations WHERE id IN ({placeholders})",
+                                     calib_ids))
+
+    summaries = {}
+    for calibration_id, set_value, calculated_value, ref_set_diff, _, unit, frequency, timestamp, *_ in sorted(
+            rows, key=lambda row: (row[7] or 0)):
+        key = (method_types.get(calibration_id), set_value, unit, frequency or "")
+        stats = summaries.get(key)
+        if stats is None:
+            existing = conn.execute(f"""
+                SELECT {", ".join(COLUMNS)} FROM drift_summary
+                WHERE method_type IS ? AND set_value IS ? AND unit IS ? AND frequency IS ?
+            """, key).fetchone()
+            stats = dict(zip(COLUMNS, existing or (0, 0.0, 0.0, None, None, None, None, None)))
+            summaries[key] = stats
+        accumulate(stats, ref_set_diff, calculated_value, timestamp)
+
+    conn.executemany(f"""
+        INSERT OR REPLACE INTO drift_summary (method_type, set_value, unit, frequency, {", ".join(COLUMNS)})
+        VALUES (?, ?, ?, ?, {", ".join("?" * len(COLUMNS))})
+    """, [(*key, *(stats[column] for column in COLUMNS)) for key, stats in summaries.items()])
+
+
+def rebuild_drift(conn, chunk_size=5000):
+    """ Recompute drift_summary from every measurement in the live database """
+    conn.execute("DELETE FROM drift_summary")
+    cursor = conn.execute("""
+        SELECT calibration_id, set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp
+        FROM measurements ORDER BY timestamp, id
+    """)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        update_drift(conn, rows)
+
+
+def fetch_drift(conn, mode=None):
+    """ Summary rows for the drift view: mode, reference, unit, frequency, count, mean, std, min, max, last diff,
+    last value and last timestamp. Only reads drift_summary. """
+    where = "WHERE method_type = ?" if mode else ""
+    rows = conn.execute(f"""
+        SELECT method_type, set_value, unit, frequency, {", ".join(COLUMNS)} FROM drift_summary
+        {where}
+        ORDER BY method_type, unit, set_value, frequency
+    """, (mode,) if mode else ()).fetchall()
+    return [(method_type, set_value, unit, frequency, count, mean_diff,
+             math.sqrt(m2_diff / (count - 1)) if count > 1 else 0.0, min_diff, max_diff, last_diff, last_value,
+             last_timestamp)
+            for method_type, set_value, unit, frequency, count, mean_diff, m2_diff, min_diff, max_diff, last_diff,
+            last_value, last_timestamp in rows]
@@ -0,0 +1,397 @@
+import inspect
+import os
+import random
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from pyvisa import constants
+from pyvisa.errors import VisaIOError
+
+# SI multipliers for the unit suffixes measProcess sends, "M" is mega and "m" is milli
+PREFIXES = {"": 1, "u": 1e-6, "m": 1e-3, "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9}
+BASE_UNITS = {"V": "V", "A": "A", "OHM": "OHM", "HZ": "Hz"}
+
+# DMM functions as (kind of calibrator output they read, AC?)
+FUNCTIONS = {
+    "VOLT:DC": ("V", False),
+    "VOLT:AC": ("V", True),
+    "CURR:DC": ("A", False),
+    "CURR:AC": ("A", True),
+    "RES": ("OHM", False),
+    "FRES": ("OHM", False),
+    "FREQ": ("Hz", True),
+}
+
+
+def parse_quantity(text):
+    """ "100 mV" -> (0.1, "V"), "10 kHz" -> (10000.0, "Hz") """
+    parts = text.strip().split()
+    value = float(parts[0])
+    unit = parts[1] if len(parts) > 1 else ""
+    for base, name in BASE_UNITS.items():
+        if unit.upper().endswith(base):
+            prefix = unit[:len(unit) - len(base)]
+            return value * PREFIXES[prefix], name
+    raise ValueError(f"Unknown unit '{unit}'")
+
+
+def short_mnemonic(header):
+    """ "CONFigure:VOLTage:DC" -> "CONF:VOLT:DC", the SCPI short form is the upper case part """
+    return ":".join("".join(c for c in node if not c.islower()) for node in header.strip(":").split(":")).upper()
+
+
+class EmulatorSettings():
+    """ Timing and noise models for the emulated bench, all times in seconds """
+
+    def __init__(self, bus_latency=0.004, settle_time=0.3, reading_time=0.02, ac_reading_time=0.1,
+                 noise_ppm_reading=5, noise_ppm_range=2, ac_noise_factor=10, lead_resistance=0.05, seed=None):
+        self.bus_latency = bus_latency
+        self.settle_time = settle_time
+        self.reading_time = reading_time
+        self.ac_reading_time = ac_reading_time
+        self.noise_ppm_reading = noise_ppm_reading
+        self.noise_ppm_range = noise_ppm_range
+        self.ac_noise_factor = ac_noise_factor
+        self.lead_resistance = lead_resistance
+        self.random = random.Random(seed)
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        """ Defaults overridden by EMULATOR_<PARAMETER> variables, e.g. EMULATOR_SETTLE_TIME=1.5 or EMULATOR_SEED=1 """
+        kwargs = {}
+        for name in inspect.signature(cls).parameters:
+            value = environ.get(f"EMULATOR_{name.upper()}")
+            if value is not None:
+                kwargs[name] = int(value) if name == "seed" else float(value)
+        return cls(**kwargs)
+
+
+class EmulatedInstrument():
+    """ Message based session with the subset of the pyvisa Resource API the app uses """
+
+    idn = ""
+
+    def __init__(self, bench, resource_name):
+        self.bench = bench
+        self.settings = bench.settings
+        self.resource_name = resource_name
+        self.timeout = 2000
+        self.output = deque()
+        self.errors = deque()
+        self.sre = 0
+        self.events_enabled = False
+
+    # --- pyvisa Resource API ---
+
+    def write(self, message):
+        with self.bench.bus:
+            time.sleep(self.settings.bus_latency)
+        for command in message.strip().split(";"):
+            if command.strip():
+                self.execute(command.strip())
+        return len(message)
+
+    def read(self):
+        deadline = time.monotonic() + self.timeout / 1000
+        while not self.output:
+            if time.monotonic() >= deadline:
+                raise VisaIOError(constants.StatusCode.error_timeout)
+            time.sleep(0.001)
+        with self.bench.bus:
+            time.sleep(self.settings.bus_latency)
+        return self.output.popleft() + "\n"
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+    def read_stb(self):
+        with self.bench.bus:
+            time.sleep(self.settings.bus_latency)
+        return self.status_byte()
+
+    def clear(self):
+        self.output.clear()
+
+    def close(self):
+        self.events_enabled = False
+
+    def enable_event(self, event_type, mechanism, context=None):
+        self.events_enabled = True
+
+    def disable_event(self, event_type, mechanism):
+        self.events_enabled = False
+
+    def discard_events(self, event_type, mechanism):
+        pass
+
+    def wait_on_event(self, event_type, timeout, capture_timeout=False):
+        if not self.events_enabled:
+            raise VisaIOError(constants.StatusCode.error_invalid_event)
+        deadline = time.monotonic() + timeout / 1000
+        while not self.status_byte() & 0x40:
+            if time.monotonic() >= deadline:
+                if capture_timeout:
+                    return SimpleNamespace(event=None, timed_out=True)
+                raise VisaIOError(constants.StatusCode.error_timeout)
+            time.sleep(0.001)
+        return SimpleNamespace(event=None, timed_out=False)
+
+    # --- instrument model ---
+
+    def status_byte(self):
+        summary = self.summary_bits()
+        if self.output:
+            summary |= 1 << 4  # MAV
+        if summary & self.sre:
+            summary |= 1 << 6  # RQS
+        return summary
+
+    def summary_bits(self):
+        return 0
+
+    def execute(self, command):
+        header, _, argument = command.partition(" ")
+        header = short_mnemonic(header)
+        if header == "*IDN?":
+            self.output.append(self.idn)
+        elif header == "*SRE":
+            self.sre = int(argument)
+        elif header in ("*CLS", "*RST"):
+            self.errors.clear()
+        else:
+            try:
+                handled = self.handle(header, argument.strip())
+            except ValueError:
+                handled = False
+            if not handled:
+                self.errors.append(f"Undefined header '{command}'")
+
+    def handle(self, header, argument):
+        return False
+
+
+class EmulatedF5522A(EmulatedInstrument):
+    """ FLUKE 5522A calibrator: OUT/OPER/STBY, ISR? settling and the ISCE1/ISCR1? transition registers """
+
+    idn = "FLUKE,5522A,0,EMULATOR"
+    SETTLED = 12
+    ISCB = 2
+
+    def __init__(self, bench, resource_name):
+        super().__init__(bench, resource_name)
+        self.operating = False
+        self.kind = "V"
+        self.amplitude = 0.0
+        self.frequency = 0.0
+        self.settled_at = 0.0
+        self.isce1 = 0
+        self.iscr1_read_at = 0.0
+
+    def reading(self, kind, ac):
+        """ What the DMM input sees for a given function """
+        if not self.operating:
+            return 0.0
+        if kind == "Hz":
+            return self.frequency if self.kind == "V" else 0.0
+        if kind != self.kind or (kind != "OHM" and ac != bool(self.frequency)):
+            return 0.0
+        return self.amplitude
+
+    def change_output(self, kind, value):
+        old = self.amplitude if kind == self.kind else 0.0
+        step = abs(value - old) / max(abs(value), abs(old), 1e-12)
+        self.kind = kind
+        self.amplitude = value
+        self.restart_settling(min(step, 2))
+
+    def restart_settling(self, step=1.0):
+        # settle time grows with the relative size of the step, a polarity flip is the worst case
+        self.settled_at = time.monotonic() + self.settings.settle_time * (1 + step) / 2
+
+    def isr(self):
+        bits = 0
+        if self.operating:
+            bits |= 1
+        if time.monotonic() >= self.settled_at:
+            bits |= 1 << self.SETTLED
+        return bits
+
+    def transitions(self):
+        """ 0->1 transitions of the settled bit since the register was last read """
+        if self.iscr1_read_at < self.settled_at <= time.monotonic():
+            return (1 << self.SETTLED) & self.isce1
+        return 0
+
+    def summary_bits(self):
+        return 1 << self.ISCB if self.transitions() else 0
+
+    def handle(self, header, argument):
+        if header == "OUT":
+            for part in argument.split(","):
+                value, unit = parse_quantity(part)
+                if unit == "Hz":
+                    self.frequency = value
+                    self.restart_settling()
+                else:
+                    self.change_output(unit, value)
+        elif header == "OPER":
+            if not self.operating:
+                self.operating = True
+                self.restart_settling()
+        elif header == "STBY":
+            self.operating = False
+        elif header == "ISR?":
+            self.output.append(str(self.isr()))
+        elif header == "ISCE1":
+            self.isce1 = int(argument)
+        elif header == "ISCR1?":
+            self.output.append(str(self.transitions()))
+            self.iscr1_read_at = time.monotonic()
+        elif header == "ERR?":
+            self.output.append(f'1,"{self.errors.popleft()}"' if self.errors else '0,"No Error"')
+        else:
+            return False
+        return True
+
+
+class EmulatedHP34401A(EmulatedInstrument):
+    """ HP 34401A multimeter: CONFigure/MEASure?/SAMPle:COUNt/TRIGger:COUNt/READ? wired to the calibrator output """
+
+    idn = "HEWLETT-PACKARD,34401A,0,EMULATOR"
+    OVERLOAD = 9.9e37
+
+    def __init__(self, bench, resource_name):
+        super().__init__(bench, resource_name)
+        self.function = "VOLT:DC"
+        self.range = 10.0
+        self.sample_count = 1
+        self.trigger_count = 1
+
+    def configure(self, function, argument):
+        if function not in FUNCTIONS:
+            raise ValueError(function)
+        self.function = function
+        self.range = float(argument) if argument and argument.upper() not in ("DEF", "AUTO") else None
+        self.sample_count = 1
+        self.trigger_count = 1
+
+    def take_reading(self):
+        kind, ac = FUNCTIONS[self.function]
+        settings = self.settings
+        time.sleep(settings.ac_reading_time if ac else settings.reading_time)
+
+        value = self.bench.source().reading(kind, ac)
+        if self.function == "RES":
+            value += settings.lead_resistance
+        full_scale = self.range if self.range else max(abs(value), 1.0)
+        if self.range and abs(value) > 1.2 * self.range:
+            return self.OVERLOAD
+
+        sigma = (settings.noise_ppm_reading * abs(value) + settings.noise_ppm_range * full_scale) * 1e-6
+        if ac:
+            sigma *= settings.ac_noise_factor
+        return value + settings.random.gauss(0.0, sigma)
+
+    def handle(self, header, argument):
+        nodes = header.split(":")
+        if nodes[0] == "CONF":
+            self.configure(":".join(nodes[1:]), argument)
+        elif nodes[0] == "MEAS" and header.endswith("?"):
+            self.configure(":".join(nodes[1:]).rstrip("?"), argument)
+            self.output.append(f"{self.take_reading():+.8E}")
+        elif header == "SAMP:COUN":
+            self.sample_count = int(argument)
+        elif header == "TRIG:COUN":
+            self.trigger_count = int(argument)
+        elif header in ("TRIG:SOUR", "INIT"):
+            pass
+        elif header in ("READ?", "FETC?"):
+            readings = [self.take_reading() for _ in range(self.sample_count * self.trigger_count)]
+            self.output.append(",".join(f"{reading:+.8E}" for reading in readings))
+        elif header == "SYST:ERR?":
+            self.output.append(f'-100,"{self.errors.popleft()}"' if self.errors else '+0,"No error"')
+        else:
+            return False
+        return True
+
+
+class EmulatedBench():
+    """ One GPIB bus with an HP 34401A whose input is wired to a FLUKE 5522A output. An instrument answers at the
+    address the app connects it on, the first connect places it there. """
+
+    MODELS = {"HP34401A": EmulatedHP34401A, "F5522A": EmulatedF5522A}
+
+    def __init__(self, settings=None, addresses=None):
+        self.settings = settings or EmulatorSettings()
+        self.bus = threading.Lock()
+        self.addresses = {}  # GPIB address -> instrument class
+        self.instruments = {}
+        for address, name in (addresses or {}).items():
+            self.place(name, address)
+
+    def place(self, name, address):
+        """ Put the named instrument at a GPIB address, moving it if it was elsewhere. address is a number or a
+        GPIB0::<address>::INSTR resource name. """
+        cls = self.MODELS[name]
+        address = self.parse_address(address)
+        if self.addresses.get(address, cls) is not cls:
+            # two instruments on one address is a wiring error on a real bus as well
+            raise VisaIOError(constants.StatusCode.error_resource_busy)
+        for other, other_cls in list(self.addresses.items()):
+            if other_cls is cls and other != address:
+                del self.addresses[other]
+                self.instruments.pop(other, None)
+        self.addresses[address] = cls
+
+    @staticmethod
+    def parse_address(address):
+        if isinstance(address, str):
+            # GPIB0::<address>::INSTR
+            try:
+                address = address.split("::")[1]
+            except IndexError:
+                raise VisaIOError(constants.StatusCode.error_resource_not_found)
+        try:
+            return int(address)
+        except ValueError:
+            raise VisaIOError(constants.StatusCode.error_resource_not_found)
+
+    def source(self):
+        for instrument in self.instruments.values():
+            if isinstance(instrument, EmulatedF5522A):
+                return instrument
+        return EmulatedF5522A(self, "")
+
+    def open(self, resource_name):
+        address = self.parse_address(resource_name)
+        cls = self.addresses.get(address)
+        if cls is None:
+            raise VisaIOError(constants.StatusCode.error_resource_not_found)
+
+        instrument = self.instruments.get(address)
+        if instrument is None:
+            instrument = cls(self, resource_name)
+            self.instruments[address] = instrument
+        return instrument
+
+
+class EmulatedResourceManager():
+    """ Stands in for pyvisa.ResourceManager when the "@emulator" backend is selected """
+
+    def __init__(self, bench=None):
+        self.bench = bench or EmulatedBench(EmulatorSettings.from_env())
+
+    def list_resources(self, query="?*::INSTR"):
+        return tuple(f"GPIB0::{address}::INSTR" for address in self.bench.addresses)
+
+    def open_resource(self, resource_name, **kwargs):
+        instrument = self.bench.open(resource_name)
+        for key, value in kwargs.items():
+            setattr(instrument, key, value)
+        return instrument
+
+    def close(self):
+        self.bench.instruments.clear()
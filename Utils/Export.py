@@ -0,0 +1,258 @@
+import csv
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from Utils.DatabaseWriter import open_reader
+from Utils.SessionQueries import count_sessions, fetch_sessions, format_timestamp, session_cursor, unpack_samples
+
+COLUMNS = ("calibration_id", "method_type", "created_at", "kind", "set_value", "calculated_value", "ref_set_diff",
+           "std", "unit", "frequency", "timestamp", "num_samples", "stop_reason")
+
+LIVE_QUERIES = {
+    "measurement": """
+        SELECT set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp, num_samples, stop_reason,
+               {samples}
+        FROM measurements WHERE calibration_id = ? ORDER BY timestamp, id
+    """,
+    "linear_measurement": """
+        SELECT linear_ref, measurement, linear_diff, linear_std, unit, NULL, timestamp, num_samples, stop_reason,
+               {samples}
+        FROM colinearity WHERE calibration_id = ? ORDER BY timestamp, id
+    """,
+}
+ARCHIVE_TABLES = {"measurement": "measurements", "linear_measurement": "colinearity"}
+
+
+def iter_calibrations(conn, ids=None, mode=None, date_from=None, date_to=None, archive=None, page_size=200):
+    """ (id, method type, created at) of the chosen calibrations, read a page at a time """
+    if ids is not None:
+        for calib_id in ids:
+            if archive is not None and archive.contains(calib_id):
+                yield archive.calibration(calib_id)
+                continue
+            row = conn.execute("SELECT id, method_type, created_at FROM calibrations WHERE id = ?",
+                               (calib_id,)).fetchone()
+            if row is not None:
+                yield row
+        return
+
+    after = None
+    while True:
+        page = fetch_sessions(conn, after, mode, date_from, date_to, page_size, archive)
+        if not page:
+            return
+        yield from page
+        after = session_cursor(page[-1])
+
+
+def iter_records(conn, calibration, archive=None, include_samples=False, chunk_size=1000):
+    """ Export records of one calibration, (values for COLUMNS, readings or None), streamed from a cursor """
+    calib_id, method_type, created_at = calibration
+    for kind, query in LIVE_QUERIES.items():
+        if archive is not None and archive.contains(calib_id):
+            rows = archive.export_rows(calib_id, ARCHIVE_TABLES[kind])
+        else:
+            rows = iter_cursor(conn.execute(query.format(samples="samples" if include_samples else "NULL"),
+                                            (calib_id,)), chunk_size)
+        for *values, samples in rows:
+            if include_samples and isinstance(samples, bytes):
+                samples = unpack_samples(samples)
+            yield (calib_id, method_type, created_at, kind, *values), samples if include_samples else None
+
+
+def iter_cursor(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+class CsvExport():
+    """ One row per point, readings as a space separated column """
+
+    def __init__(self, path, include_samples=False):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.include_samples = include_samples
+        self.writer.writerow(COLUMNS + (("samples",) if include_samples else ()))
+
+    def write(self, values, samples):
+        values = list(values)
+        values[COLUMNS.index("timestamp")] = format_timestamp(values[COLUMNS.index("timestamp")])
+        if self.include_samples:
+            values.append(" ".join(repr(float(sample)) for sample in samples) if samples is not None else "")
+        self.writer.writerow(values)
+
+    def close(self):
+        self.file.close()
+
+
+class JsonLinesExport():
+    """ One JSON object per point """
+
+    def __init__(self, path, include_samples=False):
+        self.file = open(path, "w", encoding="utf-8")
+        self.include_samples = include_samples
+
+    def write(self, values, samples):
+        record = {column: none_if_nan(value) for column, value in zip(COLUMNS, values)}
+        record["timestamp"] = format_timestamp(record["timestamp"])
+        if self.include_samples:
+            record["samples"] = samples.tolist() if samples is not None else None
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def none_if_nan(value):
+    return None if isinstance(value, float) and math.isnan(value) else value
+
+
+class NpyColumn():
+    """ A .npy file appended to in chunks, the header gets the final length when it is closed """
+
+    HEADER_SIZE = 128  # room for any shape, rewritten in place at the end
+
+    def __init__(self, path, dtype, chunk_size=4096):
+        self.file = open(path, "wb")
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self.buffer = []
+        self.length = 0
+        self.write_header()
+
+    def write_header(self):
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                       "shape": (self.length,)})
+        prefix = b"\x93NUMPY\x01\x00"
+        padding = self.HEADER_SIZE - len(prefix) - 2 - len(header) - 1
+        self.file.seek(0)
+        self.file.write(prefix + (self.HEADER_SIZE - len(prefix) - 2).to_bytes(2, "little")
+                        + (header + " " * padding + "\n").encode("latin1"))
+        self.file.seek(0, os.SEEK_END)
+
+    def append(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def extend(self, values):
+        self.flush()
+        array = np.asarray(values, dtype=self.dtype)
+        self.file.write(array.tobytes())
+        self.length += array.size
+
+    def flush(self):
+        if self.buffer:
+            self.file.write(np.array(self.buffer, dtype=self.dtype).tobytes())
+            self.length += len(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.write_header()
+        self.file.close()
+
+
+class ColumnarExport():
+    """ A directory with one .npy file per column, open them with np.load(..., mmap_mode="r") for bulk analysis.
+    Readings go to samples.npy, sample_offset and sample_count index into it. """
+
+    DTYPES = {
+        "calibration_id": "<i8", "method_type": "<U16", "created_at": "<U19", "kind": "<U18",
+        "set_value": "<f8", "calculated_value": "<f8", "ref_set_diff": "<f8", "std": "<f8", "unit": "<U8",
+        "frequency": "<U16", "timestamp": "<i8", "num_samples": "<i8", "stop_reason": "<U16",
+    }
+    MISSING = {"f": np.nan, "i": -1, "U": ""}
+
+    def __init__(self, path, include_samples=False):
+        os.makedirs(path, exist_ok=True)
+        self.columns = {column: NpyColumn(os.path.join(path, f"{column}.npy"), self.DTYPES[column])
+                        for column in COLUMNS}
+        self.include_samples = include_samples
+        if include_samples:
+            self.samples = NpyColumn(os.path.join(path, "samples.npy"), "<f8")
+            self.sample_offset = NpyColumn(os.path.join(path, "sample_offset.npy"), "<i8")
+            self.sample_count = NpyColumn(os.path.join(path, "sample_count.npy"), "<i8")
+
+    def write(self, values, samples):
+        for column, value in zip(COLUMNS, values):
+            writer = self.columns[column]
+            writer.append(self.MISSING[writer.dtype.kind] if value is None else value)
+        if self.include_samples:
+            self.sample_offset.append(self.samples.length + len(self.samples.buffer))
+            self.sample_count.append(-1 if samples is None else len(samples))
+            if samples is not None:
+                self.samples.extend(samples)
+
+    def close(self):
+        writers = list(self.columns.values())
+        if self.include_samples:
+            writers += [self.samples, self.sample_offset, self.sample_count]
+        for writer in writers:
+            writer.close()
+
+
+EXPORT_FORMATS = {
+    "CSV": (CsvExport, ".csv"),
+    "JSON Lines": (JsonLinesExport, ".jsonl"),
+    "Columnar (.npy)": (ColumnarExport, ""),
+}
+
+
+class ExportJob():
+    """ Streams the chosen calibrations to a file on a background thread, the UI polls done/total """
+
+    def __init__(self, db_name, path, export_format, archive=None, ids=None, mode=None, date_from=None,
+                 date_to=None, include_samples=False):
+        self.db_name = db_name
+        self.path = path
+        self.export_format = export_format
+        self.archive = archive
+        self.ids = ids
+        self.filters = {"mode": mode, "date_from": date_from, "date_to": date_to}
+        self.include_samples = include_samples
+
+        self.total = None  # calibrations, known once the job has counted them
+        self.done = 0
+        self.rows = 0
+        self.error = None
+        self.finished = False
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="export", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        conn = open_reader(self.db_name)
+        writer = None
+        try:
+            self.total = len(self.ids) if self.ids is not None else count_sessions(conn, archive=self.archive,
+                                                                                  **self.filters)
+            writer_class, _ = EXPORT_FORMATS[self.export_format]
+            writer = writer_class(self.path, self.include_samples)
+            for calibration in iter_calibrations(conn, self.ids, archive=self.archive, **self.filters):
+                if self.cancelled.is_set():
+                    break
+                for values, samples in iter_records(conn, calibration, self.archive, self.include_samples):
+                    writer.write(values, samples)
+                    self.rows += 1
+                self.done += 1
+        except Exception as e:
+            self.error = e
+        finally:
+            if writer is not None:
+                writer.close()
+            conn.close()
+            self.finished = True
@@ -1,3 +1,4 @@
+import asyncio
 import random
 import time
 import traceback
@@ -38,7 +39,7 @@ class GenerationAndDisplayUtils():
             if index == 4 and self.selected_mode == "RES" and not self.prompt_shown:
                 self.prompt_shown = True
                 self.running = False
-                self.after(100, self.show_pause_popup)
+                self.ui.call(self.show_pause_popup)
             new_value = round(random.uniform(0, 1000000000), 2) / 1000000
             difference = round(random.uniform(-1000, 1000), 2) / 1000
             std = round(random.uniform(0.01, 0.3), 3)
@@ -64,8 +65,8 @@ class GenerationAndDisplayUtils():
                 frequency=None
             )
 
-            self.upper_panel.value_display.update_values(current_values, difference_values, std_values)
-            self.update_idletasks()
+            # runs on a worker thread, the display is updated by the Tk thread with the latest lists
+            self.ui.post("values", list(current_values), list(difference_values), list(std_values))
 
             # Only simulate linear refs if mode is DCV or ACV
             if self.selected_mode in ["DCV", "ACV"]:
@@ -92,7 +93,7 @@ class GenerationAndDisplayUtils():
 
 
 
-        self.stop_action()
+        self.ui.call(self.stop_action)
 
     def interrupt(self,message):
         if not self.running:
@@ -100,6 +101,12 @@ class GenerationAndDisplayUtils():
             return True
 
     def log_all(self):
+        try:
+            self.queue_all()
+        finally:
+            self.flush_results()
+
+    def queue_all(self):
         meas = self.measParameters
         print("ahsvkdjasdj,mahv,mnahvskj,\n\n")
         print(meas)
@@ -121,7 +128,10 @@ class GenerationAndDisplayUtils():
                 ref_set_diff=diffMeas,
                 std=stdVar,
                 frequency=freq,
-                unit=unit
+                unit=unit,
+                num_samples=meas["numSamples"][i],
+                stop_reason=meas["stopReasons"][i],
+                samples=meas["samples"][i]
             )
         try:
             for i in range(len(meas["linearRefs"])):
@@ -133,18 +143,26 @@ class GenerationAndDisplayUtils():
                     std = meas["linearStdVars"][i]
                     unit = meas["linearUnits"][i]
                     self.log_linear_refs(
-                        calibration_id, set_value, calculated_value, ref_set_diff, std, unit
+                        calibration_id, set_value, calculated_value, ref_set_diff, std, unit,
+                        meas["linearNumSamples"][i], meas["linearStopReasons"][i], meas["linearSamples"][i]
                     )
         except Exception as e:
             print("Couldn't log linearity")
             print(e)
-    def get_calibration_values(self):
-        """Run calibration once, log and update values. Falls back to fake values on error."""
+    async def get_calibration_values(self):
+        """Run calibration once on the engine loop, log and update values. Falls back to fake values on error."""
         try:
-            self.calibrate()  # Should generate all values in one go
-
-            # Simulate graph update (fake example)
-            self.log_all()
+            try:
+                connected = await self.calibrate()  # Should generate all values in one go
+            finally:
+                # finished, stopped or crashed, whatever was measured so far is saved. The write waits on the
+                # database thread, so it runs on a worker thread and the engine loop stays free.
+                await asyncio.shield(asyncio.to_thread(self.log_all))
+            # a failed connect has already posted its own stop
+            if connected:
+                self.engine.post("call", lambda: self.stop_action(clear_graph=False))
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             if not self.skip_fake_version:
                 print(Fore.RED + Style.BRIGHT + "Exception type: " + str(type(e)))
@@ -156,7 +174,7 @@ class GenerationAndDisplayUtils():
 
                 print("Returning to fake version.")
                 self.get_calibration_values = self.generate_values_no_machine
-                self.generate_values_no_machine()
+                await asyncio.to_thread(self.generate_values_no_machine)
             else:
                 raise e
             return
@@ -0,0 +1,75 @@
+import pyvisa
+
+from Utils.Emulator import EmulatedResourceManager
+
+
+class InstrumentSessionManager():
+    """ Owns the VISA resource manager and keeps instrument sessions open between calibrations """
+
+    EMULATOR_BACKEND = "@emulator"
+
+    def __init__(self, backend=""):
+        self.backend = backend
+        self.rm = None
+        self.sessions = {}
+        self.addresses = {}
+        self.idns = {}
+
+    def resource_manager(self):
+        if self.rm is None:
+            if self.backend == self.EMULATOR_BACKEND:
+                self.rm = EmulatedResourceManager()
+            else:
+                self.rm = pyvisa.ResourceManager(self.backend)
+        return self.rm
+
+    def connect(self, name, address, timeout=5000):
+        """ Return (session, reconnected). An open session is reused as long as it answers the liveness probe. """
+        session = self.sessions.get(name)
+        if session is not None and self.addresses.get(name) == address and self.is_alive(session):
+            return session, False
+
+        self.close_session(name)
+        if self.backend == self.EMULATOR_BACKEND:
+            # the emulated instrument answers at whatever address it is configured for
+            self.resource_manager().bench.place(name, address)
+        session = self.resource_manager().open_resource(address)
+        session.timeout = timeout
+        try:
+            self.idns[name] = session.query("*IDN?").strip()
+        except Exception:
+            session.close()
+            raise
+
+        self.sessions[name] = session
+        self.addresses[name] = address
+        return session, True
+
+    def is_alive(self, session):
+        """ Serial poll the status byte, cheaper than *IDN? and does not touch the instrument's parser """
+        try:
+            session.read_stb()
+            return True
+        except Exception:
+            return False
+
+    def close_session(self, name):
+        session = self.sessions.pop(name, None)
+        self.addresses.pop(name, None)
+        self.idns.pop(name, None)
+        if session is None:
+            return
+        try:
+            session.close()
+        except Exception:
+            pass
+
+    def close_all(self):
+        for name in list(self.sessions):
+            self.close_session(name)
+        if self.rm is not None:
+            try:
+                self.rm.close()
+            except Exception:
+                pass
+            self.rm = None
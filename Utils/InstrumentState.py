@@ -0,0 +1,65 @@
+_UNKNOWN = object()
+
+
+def hp34401a_state(command):
+    """ Map an HP 34401A command to (key, value, side effects) or None if it does not set tracked state """
+    header, _, argument = command.partition(" ")
+    header = header.upper()
+    argument = " ".join(argument.split())
+    if header.startswith("CONF"):
+        # CONFigure also resets the sample and trigger counts
+        return "function", (header, argument), {"SAMPLE:COUNT": "1", "TRIGGER:COUNT": "1"}
+    if header in ("SAMPLE:COUNT", "SAMP:COUN"):
+        return "SAMPLE:COUNT", argument, {}
+    if header in ("TRIGGER:COUNT", "TRIG:COUN"):
+        return "TRIGGER:COUNT", argument, {}
+    return None
+
+
+def f5522a_state(command):
+    """ Map a FLUKE 5522A command to (key, value, side effects) or None if it does not set tracked state """
+    header, _, argument = command.partition(" ")
+    header = header.upper()
+    argument = " ".join(argument.split())
+    if header == "OUT":
+        key = "frequency" if argument.upper().endswith("HZ") else "output"
+        return key, argument, {}
+    if header == "OPER":
+        return "operate", True, {}
+    if header == "STBY":
+        return "operate", False, {}
+    return None
+
+
+class InstrumentShadow():
+    """ Last known state of one instrument, so commands that would not change it can be skipped """
+
+    def __init__(self, parser):
+        self.parser = parser
+        self.state = {}
+        self.sent = 0
+        self.skipped = 0
+
+    def needs(self, command):
+        """ True if the command has to be sent, in which case the new state is recorded """
+        if command.strip().upper().startswith("*RST"):
+            self.invalidate()
+
+        parsed = self.parser(command)
+        if parsed is None:
+            self.sent += 1
+            return True
+
+        key, value, side_effects = parsed
+        if self.state.get(key, _UNKNOWN) == value:
+            self.skipped += 1
+            return False
+
+        self.state.update(side_effects)
+        self.state[key] = value
+        self.sent += 1
+        return True
+
+    def invalidate(self):
+        """ Forget everything, the next command for every key is sent again """
+        self.state.clear()
@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+import numpy as np
+
+# key the calibration posts points to, title under the graph, axis labels, reference line and fixed x limits
+GraphView = namedtuple("GraphView", ["key", "title", "xlabel", "ylabel", "reference", "xlim"])
+
+POINTS_VIEW = GraphView("points", "Reference points", "Set value [SI]", "Reference - measured [ppm of range]",
+                        "zero", None)
+MODE_VIEWS = {
+    "DCV": [
+        GraphView("linear", "Linearity", "Set voltage [V]", "Measured voltage [V]", "identity", None),
+        GraphView("linear error", "Linearity error", "Set voltage [V]", "Reference - measured [V]", "zero", None),
+        POINTS_VIEW,
+    ],
+    "ACV": [
+        GraphView("linear", "Frequency flatness", "Set frequency [Hz]", "Measured voltage [V]", 10, (0, 110)),
+        GraphView("linear error", "Flatness error", "Set frequency [Hz]", "10 V - measured [V]", "zero", (0, 110)),
+        POINTS_VIEW,
+    ],
+}
+
+
+def views_for(mode):
+    return MODE_VIEWS.get(mode, [POINTS_VIEW])
+
+
+class RingBuffer():
+    """ Preallocated rows of float64 columns, once full the oldest rows are overwritten """
+
+    def __init__(self, capacity, columns):
+        self.data = np.full((capacity, columns), np.nan)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, row):
+        capacity = self.data.shape[0]
+        self.data[(self.start + self.size) % capacity] = row
+        if self.size < capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def view(self):
+        """ Rows oldest first, a view into the buffer unless it has wrapped """
+        end = self.start + self.size
+        if end <= self.data.shape[0]:
+            return self.data[self.start:end]
+        return np.concatenate((self.data[self.start:], self.data[:end - self.data.shape[0]]))
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+
+def minmax_decimate(y, buckets):
+    """ Indices keeping the smallest and largest y of each of buckets equal slices, in order. Spikes survive, so the
+    plot looks the same at that many pixels while drawing at most 2 * buckets points. """
+    n = len(y)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    size = -(-n // buckets)
+    rows = -(-n // size)
+    padded = np.full(rows * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(rows, size)
+    # fully NaN slices (missing readings) fall back to their first index
+    valid = ~np.isnan(padded).all(axis=1)
+    low = np.zeros(rows, dtype=np.int64)
+    high = np.zeros(rows, dtype=np.int64)
+    low[valid] = np.nanargmin(padded[valid], axis=1)
+    high[valid] = np.nanargmax(padded[valid], axis=1)
+    offsets = np.arange(rows) * size
+    indices = np.unique(np.concatenate((offsets + low, offsets + high)))
+    return indices[indices < n]
+
+
+class LivePlotData():
+    """ Live graph points as (x, y, std) rows, one ring buffer per (view key, curve) """
+
+    def __init__(self, capacity=20000):
+        self.capacity = capacity
+        self.series = {}  # (view key, curve) -> RingBuffer, in the order curves first appeared
+
+    def add(self, view, curve, x, y, std=np.nan):
+        buffer = self.series.get((view, curve))
+        if buffer is None:
+            buffer = self.series[(view, curve)] = RingBuffer(self.capacity, 3)
+        buffer.append((x, y, np.nan if std is None else std))
+
+    def curves(self, view):
+        return [(curve, buffer) for (key, curve), buffer in self.series.items() if key == view]
+
+    def clear(self):
+        for buffer in self.series.values():
+            buffer.clear()
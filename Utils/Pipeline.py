@@ -0,0 +1,59 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimeline():
+    """ Start/end times of every acquisition stage, used to report how much of the per-point work overlapped """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.entries = []  # (point, stage, start, end) relative to origin
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, point, name):
+        start = time.perf_counter() - self.origin
+        try:
+            yield
+        finally:
+            end = time.perf_counter() - self.origin
+            with self.lock:
+                self.entries.append((point, name, start, end))
+
+    async def run(self, point, name, awaitable):
+        """ Await something as a timed stage, meant to be wrapped in a task that overlaps other stages """
+        with self.stage(point, name):
+            return await awaitable
+
+    def busy_time(self):
+        return sum(end - start for _, _, start, end in self.entries)
+
+    def wall_time(self):
+        """ Length of the union of all stage intervals """
+        total = 0.0
+        current_start = current_end = None
+        for _, _, start, end in sorted(self.entries, key=lambda entry: entry[2]):
+            if current_end is None or start > current_end:
+                if current_end is not None:
+                    total += current_end - current_start
+                current_start, current_end = start, end
+            else:
+                current_end = max(current_end, end)
+        if current_end is not None:
+            total += current_end - current_start
+        return total
+
+    def overlap(self):
+        return self.busy_time() - self.wall_time()
+
+    def stage_totals(self):
+        totals = {}
+        for _, name, start, end in self.entries:
+            totals[name] = totals.get(name, 0.0) + end - start
+        return totals
+
+    def summary(self):
+        stages = ", ".join(f"{name} {seconds:.2f} s" for name, seconds in self.stage_totals().items())
+        return (f"Pipeline: {self.busy_time():.2f} s of stage work in {self.wall_time():.2f} s, "
+                f"{self.overlap():.2f} s overlapped ({stages})")
@@ -0,0 +1,90 @@
+import math
+from collections import namedtuple
+
+# value in SI units, DMM range, calibrator frequency and the phase the point belongs to (phases run in order)
+TestPoint = namedtuple("TestPoint", ["value", "range", "frequency", "phase"])
+
+DEFAULT_WEIGHTS = {
+    "range": 10.0,  # DMM range relay switch, outweighs everything else so a range is finished before the next
+    "frequency": 0.5,  # calibrator frequency change
+    "step": 1.0,  # relative output step, 0 for no change up to 2 for a polarity flip
+    "flip": 0.2,  # polarity flip within one range, replaces the step cost, no relay moves
+    "magnitude": 0.5,  # absolute output step in decades, large steps settle longer
+}
+
+
+def transition_cost(a, b, weights=DEFAULT_WEIGHTS):
+    cost = 0.0
+    if a.range != b.range:
+        cost += weights["range"]
+    if a.frequency != b.frequency:
+        cost += weights["frequency"]
+
+    delta = abs(b.value - a.value)
+    if a.range == b.range and a.value * b.value < 0:
+        cost += weights["flip"]
+    else:
+        cost += weights["step"] * delta / max(abs(a.value), abs(b.value), 1e-12)
+    cost += weights["magnitude"] * math.log10(1 + delta)
+    return cost
+
+
+def range_switches(points, order):
+    """ Number of DMM range changes between consecutive points of order """
+    return sum(points[a].range != points[b].range for a, b in zip(order, order[1:]))
+
+
+def order_cost(points, order, start, weights=DEFAULT_WEIGHTS):
+    cost = 0.0
+    previous = start
+    for index in order:
+        cost += transition_cost(previous, points[index], weights)
+        previous = points[index]
+    return cost
+
+
+def plan_order(points, start=None, weights=DEFAULT_WEIGHTS):
+    """ Execution order (indices into points) with a low total transition cost, phases are never interleaved """
+    if start is None:
+        start = TestPoint(0.0, None, None, None)
+
+    order = []
+    previous = start
+    for phase in sorted({point.phase for point in points}):
+        remaining = [i for i, point in enumerate(points) if point.phase == phase]
+
+        # greedy nearest neighbour from wherever the previous phase ended
+        phase_order = []
+        current = previous
+        while remaining:
+            best = min(remaining, key=lambda i: (transition_cost(current, points[i], weights), i))
+            remaining.remove(best)
+            phase_order.append(best)
+            current = points[best]
+
+        phase_order = improve_order(points, phase_order, previous, weights)
+        order.extend(phase_order)
+        previous = points[phase_order[-1]]
+
+    # the cost is only a model, never switch ranges more often than the order the points were given in
+    display_order = sorted(range(len(points)), key=lambda i: points[i].phase)
+    if range_switches(points, order) > range_switches(points, display_order):
+        return display_order
+    return order
+
+
+def improve_order(points, order, start, weights=DEFAULT_WEIGHTS):
+    """ 2-opt: reverse segments while that lowers the cost, the tail is left open. The first point stays where the
+    greedy pass put it, closest to start, so a run never opens with a full-scale step out of standby. """
+    best_cost = order_cost(points, order, start, weights)
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(order) - 1):
+            for j in range(i + 1, len(order)):
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                cost = order_cost(points, candidate, start, weights)
+                if cost < best_cost - 1e-12:
+                    order, best_cost = candidate, cost
+                    improved = True
+    return order
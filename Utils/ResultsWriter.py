@@ -0,0 +1,87 @@
+import threading
+import time
+
+import numpy as np
+
+from Utils.DriftSummary import update_drift
+
+INSERTS = {
+    "measurements": """
+        INSERT INTO measurements (calibration_id, set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp, num_samples, stop_reason, samples)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    "colinearity": """
+        INSERT INTO colinearity (calibration_id, linear_ref, measurement, linear_diff, linear_std, unit, timestamp, num_samples, stop_reason, samples)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+}
+
+
+def pack_samples(samples):
+    """ Raw readings as a little-endian float64 blob, None when there are none """
+    if samples is None:
+        return None
+    return np.asarray(samples, dtype="<f8").tobytes()
+
+
+def insert_calibration(conn, method_type):
+    """ Runs on the database writer thread, returns the new calibration id """
+    with conn:
+        cursor = conn.execute("INSERT INTO calibrations (method_type) VALUES (?)", (method_type,))
+    return cursor.lastrowid
+
+
+def write_rows(conn, batches):
+    """ Insert [(table, rows), ...] in one transaction, runs on the database writer thread """
+    with conn:
+        for table, rows in batches:
+            conn.executemany(INSERTS[table], rows)
+            if table == "measurements":
+                update_drift(conn, rows)
+
+
+class ResultsWriter():
+    """ Collects result rows and writes them with executemany, one transaction (and one fsync) per flush """
+
+    def __init__(self, writer, chunk_size=0, on_written=None):
+        self.writer = writer  # DatabaseWriter
+        self.on_written = on_written  # called with the calibration ids of every successful flush
+        self.chunk_size = chunk_size  # flush automatically after this many rows, 0 keeps the whole calibration
+        self.pending = {table: [] for table in INSERTS}
+        self.lock = threading.Lock()
+        self.flushes = []  # (rows, seconds) for every flush that wrote something
+
+    def add(self, table, row):
+        with self.lock:
+            self.pending[table].append(row)
+            full = self.chunk_size and self.pending_rows() >= self.chunk_size
+        if full:
+            self.flush()
+
+    def pending_rows(self):
+        return sum(len(rows) for rows in self.pending.values())
+
+    def flush(self):
+        """ Write everything queued in a single transaction, returns (rows, seconds) """
+        with self.lock:
+            batches = [(table, rows) for table, rows in self.pending.items() if rows]
+            if not batches:
+                return 0, 0.0
+            self.pending = {table: [] for table in INSERTS}
+
+            start = time.perf_counter()
+            try:
+                self.writer.call(write_rows, batches)
+            except Exception:
+                # rolled back, keep the rows so a later flush can retry them
+                for table, rows in batches:
+                    self.pending[table] = rows + self.pending[table]
+                raise
+            seconds = time.perf_counter() - start
+
+        rows = sum(len(rows) for _, rows in batches)
+        self.flushes.append((rows, seconds))
+        if self.on_written is not None:
+            # calibration_id is the first column of every table
+            self.on_written({row[0] for _, table_rows in batches for row in table_rows})
+        return rows, seconds
@@ -0,0 +1,91 @@
+import logging
+import queue
+import sys
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_size(value):
+    """ Rough bytes held by nested tuples/lists of str, numbers and None """
+    size = sys.getsizeof(value)
+    if isinstance(value, (tuple, list)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class SessionCache():
+    """ Decoded rows of recently viewed calibrations, the least recently used are dropped past max_bytes """
+
+    def __init__(self, loader, open_connection, max_bytes=32 * 2 ** 20):
+        self.loader = loader  # (conn, calibration id) -> value
+        self.open_connection = open_connection  # the prefetch thread reads through its own connection
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # calibration id -> (value, size)
+        self.size = 0
+        self.lock = threading.Lock()
+        self.generations = {}  # bumped on invalidate, so a load that raced a write is not stored
+        self.hits = 0
+        self.misses = 0
+
+        self.prefetch_queue = queue.Queue()
+        self.prefetch_thread = None
+
+    def get(self, calib_id, conn):
+        """ Cached value, or load it through conn and cache it """
+        with self.lock:
+            entry = self.entries.get(calib_id)
+            if entry is not None:
+                self.entries.move_to_end(calib_id)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            generation = self.generations.get(calib_id, 0)
+
+        value = self.loader(conn, calib_id)
+        self.put(calib_id, value, generation)
+        return value
+
+    def put(self, calib_id, value, generation):
+        size = estimate_size(value)
+        with self.lock:
+            if self.generations.get(calib_id, 0) != generation or size > self.max_bytes:
+                return
+            if calib_id in self.entries:
+                self.size -= self.entries.pop(calib_id)[1]
+            self.entries[calib_id] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, dropped) = self.entries.popitem(last=False)
+                self.size -= dropped
+
+    def invalidate(self, calib_ids):
+        """ Called after rows for these calibrations were written """
+        with self.lock:
+            for calib_id in calib_ids:
+                self.generations[calib_id] = self.generations.get(calib_id, 0) + 1
+                entry = self.entries.pop(calib_id, None)
+                if entry is not None:
+                    self.size -= entry[1]
+
+    def prefetch(self, calib_ids):
+        """ Load these calibrations in the background if they are not cached yet """
+        if self.prefetch_thread is None:
+            self.prefetch_thread = threading.Thread(target=self._prefetch_loop, name="session-prefetch", daemon=True)
+            self.prefetch_thread.start()
+        for calib_id in calib_ids:
+            self.prefetch_queue.put(calib_id)
+
+    def _prefetch_loop(self):
+        conn = self.open_connection()
+        while True:
+            calib_id = self.prefetch_queue.get()
+            with self.lock:
+                if calib_id in self.entries:
+                    continue
+                generation = self.generations.get(calib_id, 0)
+            try:
+                self.put(calib_id, self.loader(conn, calib_id), generation)
+            except Exception:
+                logger.exception(f"Prefetching calibration {calib_id} failed")
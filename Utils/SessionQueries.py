@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+SAMPLE_DTYPE = np.dtype("<f8")
+
+
+def format_timestamp(timestamp):
+    """ Local time string for an integer unix timestamp """
+    if timestamp is None:
+        return "/"
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def utc_date_bounds(date_from=None, date_to=None):
+    """ Local YYYY-MM-DD filter dates as UTC "YYYY-MM-DD HH:MM:SS" bounds comparable with created_at, which
+    CURRENT_TIMESTAMP writes in UTC. The lower bound is inclusive, the upper one is the exclusive start of the day
+    after date_to. """
+    def utc(day):
+        return datetime.strptime(day, "%Y-%m-%d").astimezone(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+    lower = utc(date_from) if date_from else None
+    upper = None
+    if date_to:
+        next_day = datetime.strptime(date_to, "%Y-%m-%d") + timedelta(days=1)
+        upper = utc(next_day.strftime("%Y-%m-%d"))
+    return lower, upper
+
+
+def session_filters(after=None, mode=None, date_from=None, date_to=None):
+    """ WHERE clause and parameters selecting calibrations """
+    conditions = []
+    parameters = []
+    if after is not None:
+        # keyset pagination, the calibrations_by_created index makes this a range scan however deep the page
+        conditions.append("(created_at, id) < (?, ?)")
+        parameters.extend(after)
+    if mode:
+        conditions.append("method_type = ?")
+        parameters.append(mode)
+    lower, upper = utc_date_bounds(date_from, date_to)
+    if lower:
+        conditions.append("created_at >= ?")
+        parameters.append(lower)
+    if upper:
+        conditions.append("created_at < ?")
+        parameters.append(upper)
+    return (f"WHERE {' AND '.join(conditions)}" if conditions else ""), parameters
+
+
+def count_sessions(conn, mode=None, date_from=None, date_to=None, archive=None):
+    where, parameters = session_filters(None, mode, date_from, date_to)
+    count = conn.execute(f"SELECT COUNT(*) FROM calibrations {where}", parameters).fetchone()[0]
+    if archive is not None:
+        count += archive.count_sessions(mode, date_from, date_to)
+    return count
+
+
+def fetch_sessions(conn, after=None, mode=None, date_from=None, date_to=None, limit=25, archive=None):
+    """ One page of calibrations, newest first. after is the (created_at, id) of the last row of the previous page,
+    dates are inclusive YYYY-MM-DD strings. Every filter is applied in SQL, so only the page is ever fetched.
+    With an archive its calibrations are merged in as if they were still in the database. """
+    where, parameters = session_filters(after, mode, date_from, date_to)
+    parameters.append(limit)
+    rows = conn.execute(f"""
+        SELECT id, method_type, created_at FROM calibrations
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, parameters).fetchall()
+
+    if archive is not None:
+        rows += archive.fetch_sessions(after, mode, date_from, date_to, limit)
+        # while a session is being archived it can briefly be in both
+        rows = sorted({row[0]: row for row in rows}.values(), key=lambda row: (row[2], row[0]), reverse=True)[:limit]
+    return rows
+
+
+def session_cursor(row):
+    """ Keyset cursor for the page that follows row """
+    return row[2], row[0]
+
+
+def session_results(conn, calib_id):
+    """ (method type, measurement rows, colinearity rows) of one calibration in the live database """
+    cursor = conn.cursor()
+
+    # Get method type
+    cursor.execute("SELECT method_type FROM calibrations WHERE id = ?", (calib_id,))
+    method_row = cursor.fetchone()
+    method_type = method_row[0] if method_row else None
+
+    # Fetch regular measurements
+    cursor.execute("""
+        SELECT set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp
+        FROM measurements
+        WHERE calibration_id = ?
+        ORDER BY timestamp, id
+    """, (calib_id,))
+    measurements = cursor.fetchall()
+
+    # Fetch colinearity
+    cursor.execute("""
+        SELECT linear_ref, measurement, linear_diff, linear_std, unit, NULL as frequency, timestamp
+        FROM colinearity
+        WHERE calibration_id = ?
+        ORDER BY timestamp, id
+    """, (calib_id,))
+    return method_type, measurements, cursor.fetchall()
+
+
+def load_session_rows(conn, calib_id, archive=None):
+    """ Display rows and raw sort keys of one calibration, for the overview table """
+    if archive is not None and archive.contains(calib_id):
+        method_type, measurements, colinearity = archive.session_results(calib_id)
+    else:
+        method_type, measurements, colinearity = session_results(conn, calib_id)
+
+    results = [(*row, "measurement") for row in measurements]
+    colinearity_results = []
+    if method_type in ("DCV", "ACV"):
+        colinearity_results = [(*row, "linear_measurement") for row in colinearity]
+
+    # Merge all
+    combined_results = results + colinearity_results
+
+    rows = []
+    sort_keys = []
+    for set_value, calculated_value, ref_set_diff, std, unit, frequency, timestamp, row_type in combined_results:
+        # linearity results are always read in volts
+        measured_unit = unit if row_type == "measurement" else "V"
+        rows.append((
+            f"{set_value} {unit}",
+            f"{calculated_value} {measured_unit}",
+            f"{ref_set_diff} {measured_unit}",
+            f"{std} {measured_unit}",
+            frequency or "/",
+            format_timestamp(timestamp),
+            row_type
+        ))
+        sort_keys.append((set_value, calculated_value, ref_set_diff, std, frequency, timestamp, row_type))
+
+    return rows, sort_keys
+
+
+def unpack_samples(blob):
+    """ Readings of one point, a read-only view of the blob without copying """
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype=SAMPLE_DTYPE)
+
+
+def load_samples(conn, calib_id, table="measurements", archive=None):
+    """ Readings of every point of a calibration as {row id: array}. All blobs are decoded with a single
+    frombuffer, the arrays are views into that buffer, or into the memory-mapped archive. """
+    if table not in ("measurements", "colinearity"):
+        raise ValueError(f"No samples in table {table}")
+    if archive is not None and archive.contains(calib_id):
+        return archive.samples(calib_id, table)
+    rows = conn.execute(f"""
+        SELECT id, samples FROM {table}
+        WHERE calibration_id = ? AND samples IS NOT NULL
+        ORDER BY timestamp, id
+    """, (calib_id,)).fetchall()
+    if not rows:
+        return {}
+
+    buffer = np.frombuffer(b"".join(blob for _, blob in rows), dtype=SAMPLE_DTYPE)
+    offsets = np.cumsum([len(blob) // SAMPLE_DTYPE.itemsize for _, blob in rows])[:-1]
+    return dict(zip((row_id for row_id, _ in rows), np.split(buffer, offsets)))
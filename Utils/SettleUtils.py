@@ -0,0 +1,100 @@
+import time
+
+from pyvisa import constants
+
+
+class SettleWaiter():
+    """ Waits for the FLUKE 5522A output to settle, using SRQ when available and paced polling otherwise """
+
+    SETTLED = 12  # ISR bit set by the 5522A once the output is settled
+    ISCB = 2  # status byte bit summarising enabled instrument status changes
+
+    def __init__(self, instrument, is_running, timeout=30.0, initial_interval=0.01, max_interval=0.25, backoff=2.0):
+        self.instrument = instrument
+        self.is_running = is_running
+        self.timeout = timeout
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+
+        self.durations = []
+        self.use_srq = self.enable_srq()
+
+    def enable_srq(self):
+        """ Ask the 5522A to raise SRQ on a 0->1 transition of the settled bit, if the backend supports events """
+        try:
+            self.instrument.enable_event(constants.EventType.service_request, constants.EventMechanism.queue)
+        except Exception:
+            return False
+
+        self.instrument.write(f"ISCE1 {1 << self.SETTLED}")
+        self.instrument.write(f"*SRE {1 << self.ISCB}")
+        return True
+
+    def disable_srq(self):
+        if not self.use_srq:
+            return
+        try:
+            self.instrument.write("*SRE 0")
+            self.instrument.disable_event(constants.EventType.service_request, constants.EventMechanism.queue)
+        except Exception:
+            pass
+        self.use_srq = False
+
+    def is_settled(self):
+        return bool(int(self.instrument.query("ISR?")) & (1 << self.SETTLED))
+
+    def wait(self):
+        """ Block until settled, stopped or timed out. Returns "settled", "stopped" or "timeout". """
+        start = time.perf_counter()
+        deadline = start + self.timeout
+
+        if self.use_srq:
+            status = self._wait_srq(deadline)
+        else:
+            status = self._wait_poll(deadline)
+
+        self.durations.append(time.perf_counter() - start)
+        return status
+
+    def _wait_srq(self, deadline):
+        # drop transitions left over from earlier points, anything after this is caught by ISR? or a new SRQ
+        self.instrument.query("ISCR1?")
+        self.instrument.discard_events(constants.EventType.service_request, constants.EventMechanism.queue)
+
+        while not self.is_settled():
+            remaining = deadline - time.perf_counter()
+            if not self.is_running():
+                return "stopped"
+            if remaining <= 0:
+                return "timeout"
+
+            # wait in short slices so Stop and the timeout are still honored
+            slice_ms = int(min(remaining, self.max_interval) * 1000) or 1
+            try:
+                response = self.instrument.wait_on_event(constants.EventType.service_request, slice_ms,
+                                                         capture_timeout=True)
+            except Exception:
+                # backend accepted the event but cannot deliver it, finish this wait by polling
+                self.disable_srq()
+                return self._wait_poll(deadline)
+            if not response.timed_out:
+                self.instrument.query("ISCR1?")  # clear the transition register so ISCB drops again
+        return "settled"
+
+    def _wait_poll(self, deadline):
+        interval = self.initial_interval
+        while not self.is_settled():
+            if not self.is_running():
+                return "stopped"
+            now = time.perf_counter()
+            if now >= deadline:
+                return "timeout"
+
+            time.sleep(min(interval, deadline - now))
+            interval = min(interval * self.backoff, self.max_interval)
+        return "settled"
+
+    @property
+    def last_duration(self):
+        return self.durations[-1] if self.durations else None
@@ -0,0 +1,103 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class UIDispatcher():
+    """ Worker threads post UI events here, the Tk thread drains them once per frame. Events of the same kind are
+    coalesced, so a burst of updates costs one widget update per frame instead of one per event. """
+
+    def __init__(self, root, frame_ms=33):
+        self.root = root
+        self.frame_ms = frame_ms
+        self.events = queue.SimpleQueue()
+        self.handlers = {}  # kind -> (handler, coalesce)
+        self.ui_thread = threading.get_ident()
+        self.drain_times = deque(maxlen=600)  # (seconds, events) of the last frames that had work
+        self.started = False
+
+    def register(self, kind, handler, coalesce="all"):
+        """ coalesce "all" calls handler(*payload) for every event, "latest" only for the newest event per key and
+        "concat" once per frame with a list of the first payload item of every event """
+        self.handlers[kind] = (handler, coalesce)
+
+    def on_ui_thread(self):
+        return threading.get_ident() == self.ui_thread
+
+    def post(self, kind, *payload, key=None):
+        """ Queue an event, safe from any thread. A kind nobody registered is a bug in the caller and raises. """
+        if kind != "call" and kind not in self.handlers:
+            raise KeyError(f"No UI handler registered for '{kind}'")
+        self.events.put((kind, key, payload))
+
+    def call(self, function, *args):
+        """ Run function(*args) on the Tk thread """
+        self.post("call", function, *args)
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            self.root.after(self.frame_ms, self.drain)
+
+    def drain(self):
+        start = time.perf_counter()
+        # events in the order they were posted, coalescing only within a run of events of one kind, so a handler
+        # never sees a later event before an earlier one of another kind
+        pending = []  # [kind, payload], None once a newer "latest" event replaced it
+        run_kind = None
+        run_latest = {}  # key -> index in pending of the newest "latest" event of the current run
+        count = 0
+        while True:
+            try:
+                kind, key, payload = self.events.get_nowait()
+            except queue.Empty:
+                break
+            count += 1
+            if kind != run_kind:
+                run_kind = kind
+                run_latest = {}
+            coalesce = self.handlers.get(kind, (None, "all"))[1]
+            if coalesce == "latest":
+                if key in run_latest:
+                    pending[run_latest[key]] = None
+                run_latest[key] = len(pending)
+                pending.append((kind, payload))
+            elif coalesce == "concat":
+                if pending and pending[-1] is not None and pending[-1][0] == kind:
+                    pending[-1][1].append(payload[0])
+                else:
+                    pending.append((kind, [payload[0]]))
+            else:
+                pending.append((kind, payload))
+
+        for entry in pending:
+            if entry is None:
+                continue
+            kind, payload = entry
+            handler, coalesce = self.handlers.get(kind, (None, "all"))
+            try:
+                if kind == "call":
+                    payload[0](*payload[1:])
+                elif coalesce == "concat":
+                    handler(payload)
+                else:
+                    handler(*payload)
+            except Exception:
+                # a failing update must not stop the frame loop
+                logger.exception(f"UI update '{kind}' failed")
+
+        if count:
+            self.drain_times.append((time.perf_counter() - start, count))
+        self.root.after(self.frame_ms, self.drain)
+
+    def summary(self):
+        if not self.drain_times:
+            return "UI: no updates"
+        seconds = [elapsed for elapsed, _ in self.drain_times]
+        events = sum(count for _, count in self.drain_times)
+        return (f"UI: {events} events in {len(seconds)} frames, drain mean {1000 * sum(seconds) / len(seconds):.1f} ms, "
+                f"max {1000 * max(seconds):.1f} ms")
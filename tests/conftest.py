@@ -0,0 +1,91 @@
+import logging
+
+import pytest
+
+from Utils.CalibrationUtils import CalibrationUtils
+from Utils.Emulator import EmulatedInstrument
+from Utils.GenerationAndDisplayUtils import GenerationAndDisplayUtils
+from Utils.UIDispatcher import UIDispatcher
+
+
+class Terminal():
+    def __init__(self):
+        self.lines = []
+
+    def log(self, message, level=logging.INFO):
+        self.lines.append(message)
+
+    def write_lines(self, entries):
+        self.lines.extend(message for _, message in entries)
+
+
+class ValueDisplay():
+    def update_values(self, *args):
+        pass
+
+
+class UpperPanel():
+    value_display = ValueDisplay()
+
+
+class Graph():
+    def update_data(self, values):
+        pass
+
+    def clear_graph(self):
+        pass
+
+
+class EmulatedApp(CalibrationUtils, GenerationAndDisplayUtils):
+    """ The calibration side of App without any widgets, wired to the "@emulator" backend """
+
+    def __init__(self, db_name):
+        self.visa_backend = "@emulator"
+        self.selected_mode = ""
+        self.skip_fake_version = True
+        self.running = True
+        self.terminal = Terminal()
+        self.upper_panel = UpperPanel()
+        self.graph = Graph()
+        self.ui = UIDispatcher(self)
+        CalibrationUtils.__init__(self, db_name)
+        self.archive_after_days = None
+        self.current_calibration_id = self.log_new_calibration("test")
+
+    def after(self, ms, function, *args):
+        pass
+
+    def show_pause_popup(self):
+        pass
+
+    def show_input_popup(self, **kwargs):
+        pass
+
+    def stop_action(self, clear_graph=True):
+        self.running = False
+        self.engine.stop()
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    for name, value in {"SETTLE_TIME": "0.01", "BUS_LATENCY": "0", "READING_TIME": "0.001",
+                        "AC_READING_TIME": "0.001", "SEED": "1"}.items():
+        monkeypatch.setenv(f"EMULATOR_{name}", value)
+    app = EmulatedApp(str(tmp_path / "calibration.db"))
+    yield app
+    app.engine.close()
+    app.close()
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    """ Every command either instrument executes, in order, as (instrument class, command) """
+    commands = []
+    execute = EmulatedInstrument.execute
+
+    def recording_execute(instrument, command):
+        commands.append((type(instrument), command))
+        execute(instrument, command)
+
+    monkeypatch.setattr(EmulatedInstrument, "execute", recording_execute)
+    return commands
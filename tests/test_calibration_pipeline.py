@@ -0,0 +1,20 @@
+import pytest
+
+from Utils.Emulator import EmulatedF5522A, EmulatedHP34401A
+
+
+@pytest.mark.parametrize("mode", ["DCI", "DCV"])
+def test_dmm_is_only_configured_while_calibrator_is_in_standby(app, bus, mode):
+    app.changeMeasParam(mode)
+    app.selected_mode = mode
+    app.engine.submit(app.get_calibration_values).result(timeout=120)
+
+    operating = False
+    configures = 0
+    for instrument, command in bus:
+        if instrument is EmulatedF5522A and command in ("OPER", "STBY"):
+            operating = command == "OPER"
+        elif instrument is EmulatedHP34401A and command.upper().startswith("CONF"):
+            assert not operating, f"{command} sent while the 5522A was operating"
+            configures += 1
+    assert configures > 1
@@ -0,0 +1,41 @@
+import pytest
+
+from Utils import PointPlanner
+from Utils.PointPlanner import plan_order, range_switches
+
+# imported under another name so pytest does not take the namedtuple for a test class
+Point = PointPlanner.TestPoint
+
+
+def planned(app, mode):
+    """ (ranges, planned order) for the reference points of a mode """
+    app.changeMeasParam(mode)
+    app.measType = app.measParameters["measType"]
+    app.dirType = app.measParameters["dirType"]
+    return app.measParameters["range"], app.planMeasOrder()
+
+
+@pytest.mark.parametrize("mode", ["DCV", "DCI", "ACV", "ACI", "RES"])
+def test_plan_never_adds_range_switches(app, mode):
+    ranges, order = planned(app, mode)
+    assert sorted(order) == list(range(len(ranges)))
+    points = [Point(0.0, measRange, None, 0) for measRange in ranges]
+    assert range_switches(points, order) <= range_switches(points, list(range(len(ranges))))
+
+
+@pytest.mark.parametrize("mode", ["DCV", "DCI"])
+def test_plan_finishes_each_range_before_the_next(app, mode):
+    ranges, order = planned(app, mode)
+    visited = [ranges[order[0]]]
+    for index in order[1:]:
+        if ranges[index] != visited[-1]:
+            assert ranges[index] not in visited
+            visited.append(ranges[index])
+    assert order[0] == 0
+
+
+def test_polarity_flip_within_a_range_is_cheaper_than_a_range_switch():
+    points = [Point(0.0, 1, None, 0), Point(1.0, 1, None, 0), Point(-1.0, 1, None, 0),
+              Point(1.0, 10, None, 0)]
+    order = plan_order(points)
+    assert order[:3] in ([0, 1, 2], [0, 2, 1])
@@ -0,0 +1,30 @@
+import pytest
+
+from Utils.UIDispatcher import UIDispatcher
+
+
+class Root():
+    def after(self, ms, function):
+        pass
+
+
+@pytest.fixture
+def dispatcher():
+    return UIDispatcher(Root())
+
+
+def test_drain_keeps_events_in_posted_order(dispatcher):
+    handled = []
+    dispatcher.register("graph", lambda batches: handled.append(("graph", batches)), "concat")
+    dispatcher.register("point", lambda number: handled.append(("point", number)), "latest")
+    for kind, value in [("graph", 1), ("graph", 2), ("point", 0), ("point", 0), ("graph", 3)]:
+        dispatcher.post(kind, value, key=value if kind == "point" else None)
+    dispatcher.call(handled.append, "stop")
+    dispatcher.post("graph", 4)
+    dispatcher.drain()
+    assert handled == [("graph", [1, 2]), ("point", 0), ("graph", [3]), "stop", ("graph", [4])]
+
+
+def test_posting_an_unregistered_kind_raises(dispatcher):
+    with pytest.raises(KeyError):
+        dispatcher.post("nobody", 1)